@@ -2,18 +2,26 @@ import os
 import re
 import shlex
 import stat
+import string
 import sys
 import time
 import json
+import hashlib
+import mmap
 import sqlite3
 import subprocess
+import threading
+import queue
 from dataclasses import dataclass, field
 from datetime import datetime, timezone as tz
 from pathlib import Path
-from typing import Optional, Dict, List, Tuple, Set, Any
+from typing import Optional, Dict, List, Tuple, Set, Any, Iterator
 from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 import argparse
+import atexit
+import concurrent.futures
+import functools
 import platform
 import shutil
 import importlib.util
@@ -24,8 +32,6 @@ import resource
 import pathlib
 
 # --- Moduły agenta ---
-from modules.hardware_bridge import HardwareBridge
-from modules.browser_bridge import BrowserBridge
 from modules.intents.recognizer import recognize_intent
 from modules.intents.extract_slots import extract_slots
 from modules.policy.router import route
@@ -36,9 +42,31 @@ from modules.dialog.manager_v2 import ask_for_missing_slots
 from modules.tools.registry import registry
 from modules.tools.web_fetch import resolve_natural_query
 
-# --- Instancje globalne ---
-bridge = HardwareBridge()
-browser = BrowserBridge()
+
+class _LazyInstance:
+    """
+    Zastępca obiektu: import modułu i konstruktor klasy dopiero przy pierwszym
+    użyciu atrybutu. BrowserBridge ciągnie Playwright, HardwareBridge czyta
+    konfiguracje urządzeń — żadne z nich nie jest potrzebne do startu CLI.
+    Konstrukcja pod blokadą: równoległe pierwsze użycia tworzą jedną instancję.
+    """
+    def __init__(self, module: str, cls: str):
+        self._module = module
+        self._cls = cls
+        self._obj = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._obj is None:
+            with self._lock:
+                if self._obj is None:
+                    self._obj = getattr(importlib.import_module(self._module), self._cls)()
+        return getattr(self._obj, name)
+
+
+# --- Instancje globalne (leniwe) ---
+bridge = _LazyInstance("modules.hardware_bridge", "HardwareBridge")
+browser = _LazyInstance("modules.browser_bridge", "BrowserBridge")
 def intent_pipeline(user_text):
     intent_info = recognize_intent(user_text)
     intent = intent_info.get("intent")
@@ -90,12 +118,6 @@ try:
 except Exception:
     code_sandbox = None
 
-# ---- task intelligence layer ----
-try:
-    from modules import intelligence
-except Exception:
-    intelligence = None
-
 # --- [konfiguracja wykonania py] ---
 PY_ALLOW_DIRS = [
     "/opt/halbridge",                  # główny katalog projektu
@@ -122,6 +144,21 @@ try:
 except Exception:
     psutil = None
 
+try:
+    import numpy as np  # używane w SemanticCache
+except Exception:
+    np = None
+
+try:
+    import orjson    # szybsza (de)serializacja wyników narzędzi
+except Exception:
+    orjson = None
+
+try:
+    import tiktoken  # liczenie tokenów historii (bez niego: ~4 znaki/token)
+except Exception:
+    tiktoken = None
+
 try:
     import getpass
 except Exception:
@@ -134,6 +171,37 @@ except ImportError:
 
 APP_VERSION = "v3.2"
 
+
+def _jdumps(obj: Any) -> str:
+    """JSON jako str: orjson jeśli jest, inaczej json (ensure_ascii=False)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False)
+
+
+_jloads = orjson.loads if orjson is not None else json.loads
+
+
+@functools.lru_cache(maxsize=8)
+def _token_encoder(model: str):
+    """Enkoder tiktoken dla modelu (tworzony raz); None gdy brak tiktoken."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    enc = _token_encoder(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
 # --- Globalny przełącznik trybu uruchamiania skryptów Python ---
 GLOBAL_PY_EXEC_MODE = globals().get("GLOBAL_PY_EXEC_MODE", "interactive")  # "interactive" | "capture"
 
@@ -305,6 +373,7 @@ def show_help() -> str:
         "  code [plik.py] <prompt>   — generuj→napraw→zapisz→uruchom\n"
         "  vcs init|status|log|diff|commit \"msg\" — git w projekcie\n"
         "  net on|off|allow|deny|list|get — sieć (whitelist)\n"
+        "  batch submit <plik> / status <id> / fetch <id> — Batch API (prompt na linię, -50% kosztu)\n"
         "  !<komenda>                — surowy shell\n"
         "  exit                      — wyjście\n"
     )
@@ -324,12 +393,14 @@ class Config:
     OPENAI_MODEL: str = "gpt-4o-mini"
     OPENAI_TEMPERATURE: float = 0.2
     OPENAI_MAX_TOKENS: int = 1200
+    OPENAI_MAX_CTX: int = 128_000                  # okno kontekstu modelu (tokeny)
 
     DB_PATH: str = "agent_memory.sqlite3"
     PROJECTS_DIR: str = "projects"
     CURRENT_PROJECT_FILE: str = "projects/.current"
 
     EXEC_TIMEOUT: int = 60
+    MODULE_TIMEOUT: int = 30                       # limit dla 'module run' (in-process)
 
     # Sandbox plików
     ALLOWED_DIRS: List[str] = None
@@ -338,6 +409,7 @@ class Config:
     # ---------- Token meter ----------
     TOKEN_LOG_PATH: str = "token_usage.csv"        # historia wywołań
     TOKEN_TOTALS_PATH: str = "token_totals.json"   # sumy kumulowane
+    TOKEN_FSYNC_EVERY: int = 20                    # fsync sum co N zapisów
 
     # ---------- Proste logi OUT/ERR ----------
     RUN_OUT_FILE: str = "halbridge.out"
@@ -363,10 +435,25 @@ class Config:
     SUMMARY_WINDOW: int = 30                       # ile ostatnich msg do streszczenia
     SUMMARY_MAX_CHARS: int = 2000                  # budżet znaków na streszczenie
 
+    # ---------- Cache odpowiedzi LLM ----------
+    ENABLE_RESP_CACHE: bool = True                 # identyczne zapytanie → odpowiedź z sqlite
+    RESP_CACHE_TTL: int = 24 * 3600                # sekundy
+    ENABLE_SEM_CACHE: bool = False                 # podobne prompty (embeddingi) → odpowiedź z cache
+    SEM_CACHE_PATH: str = "~/.halbridge/semcache.npz"
+    PREFIX_FILE: str = "~/.halbridge/prefix.txt"   # ostatni wysłany stały prefiks (system + tools)
+    SEM_CACHE_MODEL: str = "text-embedding-3-small"
+    SEM_CACHE_THRESHOLD: float = 0.93              # min. podobieństwo kosinusowe
+    SEM_CACHE_MAX: int = 2000                      # ile wpisów trzymać (LRU)
+
+    # ---------- Generowanie kodu ----------
+    SPECULATIVE_CODEGEN: bool = False              # 'code': n kandydatów w jednym wywołaniu
+    CODEGEN_CANDIDATES: int = 2
+
     def __post_init__(self):
         if self.MODEL_PRICING is None:
             self.MODEL_PRICING = {
                 "gpt-4o-mini": {"input_per_1k": 0.005, "output_per_1k": 0.015},
+                "text-embedding-3-small": {"input_per_1k": 0.00002, "output_per_1k": 0.0},
             }
         if self.ALLOWED_DIRS is None:
             self.ALLOWED_DIRS = [str(Path(self.PROJECTS_DIR).resolve())]
@@ -384,6 +471,24 @@ def ensure_dirs(cfg: Config):
         cur.write_text("default", encoding="utf-8")
 
 
+def _atomic_write_text(path: Path, text: str, fsync: bool = False) -> None:
+    """
+    Zapis przez plik tymczasowy + os.replace(): czytelnik widzi starą albo nową
+    treść, nigdy połówkę. fsync tylko na żądanie (punkty kontrolne).
+    """
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    try:
+        shutil.copymode(path, tmp)
+    except OSError:
+        pass
+    os.replace(tmp, path)
+
+
 class MemoryStore:
     """
     Tabele:
@@ -394,6 +499,10 @@ class MemoryStore:
     """
     def __init__(self, cfg: Config):
         self.db = sqlite3.connect(cfg.DB_PATH)
+        # cache get_recent_messages: (session_id, limit) → (wersja, wiersze);
+        # add_message podbija wersję, więc wpis jest ważny do następnego zapisu
+        self._version = 0
+        self._recent_cache: Dict[Tuple[str, int], Tuple[int, List[Dict]]] = {}
         self.db.execute(
             """
             CREATE TABLE IF NOT EXISTS sessions (
@@ -453,16 +562,23 @@ class MemoryStore:
             (session_id, role, content, datetime.now(tz=tz.utc).isoformat()),
         )
         self.db.commit()
+        self._version += 1
         return cur.lastrowid
 
     def get_recent_messages(self, session_id: str, limit: int = 12) -> List[Dict]:
+        key = (session_id, limit)
+        hit = self._recent_cache.get(key)
+        if hit is not None and hit[0] == self._version:
+            return list(hit[1])
         cur = self.db.execute(
             "SELECT role, content FROM messages WHERE session_id=? ORDER BY id DESC LIMIT ?",
             (session_id, limit),
         )
         rows = cur.fetchall()
         rows.reverse()
-        return [{"role": r, "content": c} for (r, c) in rows]
+        msgs = [{"role": r, "content": c} for (r, c) in rows]
+        self._recent_cache[key] = (self._version, msgs)
+        return list(msgs)
 
     def get_messages_since(self, session_id: str, after_id: int, limit: int = 100) -> List[Dict]:
         cur = self.db.execute(
@@ -558,8 +674,242 @@ class MemoryStore:
             rows.append({"id": i, "kind": k, "content": c, "pinned": bool(p), "created_at": ts_})
         return rows
 
+
+class ResponseCache:
+    """
+    Cache odpowiedzi LLM w tej samej bazie co pamięć:
+      response_cache(key TEXT PK, value TEXT, ts INTEGER)
+    Klucz = sha256(model, temperature, max_tokens, messages, tools).
+    """
+    def __init__(self, cfg: Config):
+        self.ttl = cfg.RESP_CACHE_TTL
+        self.db = sqlite3.connect(cfg.DB_PATH)
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                ts INTEGER
+            )
+            """
+        )
+        self.db.execute("DELETE FROM response_cache WHERE ts<?", (int(time.time()) - self.ttl,))
+        self.db.commit()
+
+    @staticmethod
+    def key(model: str, temperature: float, max_tokens: int, messages: List[Dict], tools: Any) -> str:
+        blob = json.dumps([model, temperature, max_tokens, messages, tools], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        cur = self.db.execute(
+            "SELECT value FROM response_cache WHERE key=? AND ts>=?",
+            (key, int(time.time()) - self.ttl),
+        )
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: str) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, ts) VALUES (?, ?, ?)",
+            (key, value, int(time.time())),
+        )
+        self.db.commit()
+
+    def clear(self) -> int:
+        cur = self.db.execute("DELETE FROM response_cache")
+        self.db.commit()
+        return cur.rowcount
+
+
+class SemanticCache:
+    """
+    Cache semantyczny: znormalizowane embeddingi promptów + odpowiedzi w .npz.
+    Wektory mają normę 1, więc podobieństwo kosinusowe to jeden matmul.
+    Każdy wpis ma odcisk kontekstu rozmowy (historia + dynamiczny system) —
+    trafienie tylko przy tym samym kontekście, inaczej „a drugi?” dostałoby
+    odpowiedź z innej rozmowy. Wymaga numpy; bez niego jest po prostu wyłączony.
+    """
+    def __init__(self, cfg: Config, logger: "RotatingLogger"):
+        self.cfg = cfg
+        self.logger = logger
+        self.path = Path(cfg.SEM_CACHE_PATH).expanduser()
+        self.vecs = None            # np.ndarray (N, D) float32
+        self.prompts: List[str] = []
+        self.answers: List[str] = []
+        self.ctxs: List[str] = []   # odcisk kontekstu rozmowy per wpis (context_key)
+        self.used = None            # np.ndarray (N,) — ostatnie użycie (LRU/TTL)
+        self._loaded = False
+
+    @staticmethod
+    def context_key(msgs: List[Dict]) -> str:
+        """Odcisk wszystkiego poza stałym promptem systemowym i samym pytaniem."""
+        return hashlib.blake2b(_jdumps(msgs[1:-1]).encode("utf-8"), digest_size=16).hexdigest()
+
+    @property
+    def enabled(self) -> bool:
+        return np is not None and self.cfg.ENABLE_SEM_CACHE
+
+    def _load(self) -> None:
+        self._loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self.vecs = data["vecs"].astype(np.float32, copy=False)
+                self.prompts = data["prompts"].tolist()
+                self.answers = data["answers"].tolist()
+                self.used = data["used"].astype(np.float64, copy=False)
+                # stare pliki bez odcisków: kontekst nieznany → wpisy nigdy nie trafią
+                self.ctxs = data["ctxs"].tolist() if "ctxs" in data.files else [""] * len(self.answers)
+        except Exception as e:
+            self.logger.log("semcache.load.error", error=str(e))
+            self.vecs, self.prompts, self.answers, self.ctxs, self.used = None, [], [], [], None
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                vecs=self.vecs,
+                prompts=np.array(self.prompts, dtype=str),
+                answers=np.array(self.answers, dtype=str),
+                ctxs=np.array(self.ctxs, dtype=str),
+                used=self.used,
+            )
+        os.replace(tmp, self.path)
+
+    def embed(self, client, text: str):
+        resp = client.embeddings.create(model=self.cfg.SEM_CACHE_MODEL, input=text)
+        v = np.asarray(resp.data[0].embedding, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return (v / n if n else v), int(getattr(getattr(resp, "usage", None), "prompt_tokens", 0) or 0)
+
+    def lookup(self, q, ctx: str) -> Optional[str]:
+        if not self._loaded:
+            self._load()
+        if self.vecs is None or not len(self.answers):
+            return None
+        now = time.time()
+        sims = self.vecs @ q
+        sims[self.used < now - self.cfg.RESP_CACHE_TTL] = -1.0
+        sims[np.array(self.ctxs) != ctx] = -1.0
+        i = int(np.argmax(sims))
+        if sims[i] < self.cfg.SEM_CACHE_THRESHOLD:
+            return None
+        self.used[i] = now
+        self.logger.log("semcache.hit", sim=round(float(sims[i]), 4), prompt=self.prompts[i][:80])
+        return self.answers[i]
+
+    def add(self, q, prompt: str, answer: str, ctx: str) -> None:
+        if not self._loaded:
+            self._load()
+        now = time.time()
+        if self.vecs is None:
+            self.vecs = q[None, :]
+            self.used = np.array([now])
+        else:
+            self.vecs = np.vstack([self.vecs, q])
+            self.used = np.append(self.used, now)
+        self.prompts.append(prompt)
+        self.answers.append(answer)
+        self.ctxs.append(ctx)
+        if len(self.answers) > self.cfg.SEM_CACHE_MAX:
+            keep = np.sort(np.argsort(self.used)[-self.cfg.SEM_CACHE_MAX:])
+            self.vecs, self.used = self.vecs[keep], self.used[keep]
+            self.prompts = [self.prompts[i] for i in keep]
+            self.answers = [self.answers[i] for i in keep]
+            self.ctxs = [self.ctxs[i] for i in keep]
+        try:
+            self._save()
+        except Exception as e:
+            self.logger.log("semcache.save.error", error=str(e))
+
 # =================== LOGGER Z ROTACJĄ ===================
 
+class _LogWriter:
+    """
+    Jeden wątek w tle, który dopisuje tekst do plików logów.
+    Wywołujący tylko wrzuca (ścieżka, tekst) do kolejki — zapis na dysk nie
+    blokuje komend/LLM. Uchwyty plików są trzymane otwarte; flush gdy kolejka
+    opustoszeje. Przy przepełnieniu wyrzucamy najstarszy wpis.
+    """
+    MAX_PENDING = 10_000
+
+    def __init__(self):
+        self._q: "queue.Queue[Tuple[str, Optional[str], int, Any]]" = queue.Queue(maxsize=self.MAX_PENDING)
+        self._handles: Dict[str, Any] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="log-writer", daemon=True)
+                    self._thread.start()
+
+    def _put(self, item) -> None:
+        self._ensure_thread()
+        while True:
+            try:
+                self._q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._q.get_nowait()
+                    self._q.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def append(self, path: str, text: str, max_bytes: int = 0, on_rotate=None) -> None:
+        """Dopisz tekst; gdy plik przekroczy max_bytes, zamknij go i wywołaj on_rotate()."""
+        self._put((str(path), text, max_bytes, on_rotate))
+
+    def close(self, path: str) -> None:
+        """Zamknij uchwyt (np. przed usunięciem pliku) i poczekaj na zapis."""
+        self._put((str(path), None, 0, None))
+        self.flush()
+
+    def flush(self) -> None:
+        if self._thread is not None:
+            self._q.join()
+
+    def _loop(self) -> None:
+        while True:
+            path, text, max_bytes, on_rotate = self._q.get()
+            try:
+                if text is None:
+                    fh = self._handles.pop(path, None)
+                    if fh:
+                        fh.close()
+                    continue
+                fh = self._handles.get(path)
+                if fh is None:
+                    Path(path).parent.mkdir(parents=True, exist_ok=True)
+                    fh = self._handles[path] = open(path, "a", encoding="utf-8")
+                fh.write(text)
+                if max_bytes and fh.tell() > max_bytes:
+                    self._handles.pop(path).close()
+                    if on_rotate:
+                        on_rotate()
+                elif self._q.empty():
+                    for h in self._handles.values():
+                        h.flush()
+            except Exception:
+                # log nie może wywrócić agenta
+                pass
+            finally:
+                self._q.task_done()
+
+
+_LOG_WRITER = _LogWriter()
+atexit.register(_LOG_WRITER.flush)
+
+
 class RotatingLogger:
     def __init__(self, cfg: Config):
         self.path = Path(cfg.APP_LOG_FILE)
@@ -574,11 +924,14 @@ class RotatingLogger:
             **kwargs,
         }
         line = json.dumps(rec, ensure_ascii=False)
-        with open(self.path, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-        self._rotate()
+        _LOG_WRITER.append(str(self.path), line + "\n", self.max_bytes, self._rotate)
+
+    def flush(self) -> None:
+        """Poczekaj, aż wątek logów zapisze wszystko, co jest w kolejce."""
+        _LOG_WRITER.flush()
 
     def _rotate(self):
+        # wołane z wątku logów, po zamknięciu uchwytu bieżącego pliku
         if self.path.exists() and self.path.stat().st_size > self.max_bytes:
             # przesuwamy .N -> .N+1
             for i in range(self.backups, 0, -1):
@@ -592,6 +945,7 @@ class RotatingLogger:
             self.path.rename(self.path.with_suffix(self.path.suffix + ".1"))
 
     def tail(self, n: int = 100) -> str:
+        self.flush()
         if not self.path.exists():
             return "(brak logów)"
         with open(self.path, "r", encoding="utf-8") as f:
@@ -599,6 +953,7 @@ class RotatingLogger:
         return "".join(lines[-n:])
 
     def show(self, pattern: Optional[str] = None) -> List[dict]:
+        self.flush()
         if not self.path.exists():
             return []
         rows = []
@@ -616,7 +971,38 @@ class RotatingLogger:
                     rows.append(rec)
         return rows
 
+    def grep(self, pattern: str) -> Iterator[str]:
+        """
+        Linie logu pasujące do wzorca (bez rozróżniania wielkości liter).
+        Wzorzec ASCII: regex na bajtach po mmap — niepasujące linie nie są
+        dekodowane ani kopiowane. Inny wzorzec: zwykłe czytanie linia po linii.
+        """
+        self.flush()
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        if not pattern.isascii():
+            rx = re.compile(pattern, re.IGNORECASE)
+            with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+                for L in f:
+                    if rx.search(L):
+                        yield L.rstrip()
+            return
+        rx_b = re.compile(pattern.encode("ascii"), re.IGNORECASE | re.MULTILINE)
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos, size = 0, len(mm)
+            while pos < size:
+                m = rx_b.search(mm, pos)
+                if not m:
+                    break
+                start = mm.rfind(b"\n", 0, m.start()) + 1
+                end = mm.find(b"\n", m.end())
+                if end < 0:
+                    end = size
+                yield mm[start:end].decode("utf-8", errors="replace").rstrip()
+                pos = end + 1
+
     def export(self, out_path: str) -> str:
+        self.flush()
         if not self.path.exists():
             return "❌ Brak logów do eksportu"
         try:
@@ -629,6 +1015,7 @@ class RotatingLogger:
 
     def clear(self) -> str:
         try:
+            _LOG_WRITER.close(str(self.path))
             self.path.unlink(missing_ok=True)
             base = str(self.path)
             for i in range(1, self.backups + 1):
@@ -720,11 +1107,9 @@ def render_diag(cfg: Config, api: "GPTChatAPI") -> str:
 
     # Tokeny / koszt
     try:
-        totals = api.meter._load_totals()
-        pt = int(totals.get("prompt_tokens", 0))
-        ct = int(totals.get("completion_tokens", 0))
-        usd = float(totals.get("cost_usd", 0.0))
-        pln = float(totals.get("cost_pln", 0.0))
+        totals = api.meter.totals
+        pt, ct = totals.prompt_tokens, totals.completion_tokens
+        usd, pln = totals.cost_usd, totals.cost_pln
         lines.append(
             f"Tokeny: prompt={pt}, completion={ct} | "
             f"Koszt: {usd:.4f} USD ~ {pln:.2f} PLN"
@@ -762,11 +1147,8 @@ def render_diag(cfg: Config, api) -> str:
     except Exception as e:
         sysinfo = {"error": str(e)}
 
-    # tokeny (z pliku totals) + skrót ze `summary()`
-    try:
-        totals = api.meter._load_totals()  # wewnętrzne, ale przydatne do zbiorczego widoku
-    except Exception:
-        totals = {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "cost_pln": 0.0}
+    # tokeny (sumy z TokenMeter) + skrót ze `summary()`
+    totals = getattr(api.meter, "totals", None) or TokenTotals()
 
     log_path = Path(cfg.APP_LOG_FILE)
     log_exists = log_path.exists()
@@ -782,8 +1164,8 @@ def render_diag(cfg: Config, api) -> str:
     lines.append("net_whitelist: " + (", ".join(sorted(cfg.NET_ALLOWED)) if cfg.NET_ALLOWED else "(pusto)"))
     lines.append(f"project: {api.projects.current_name()}  @  {api.projects.current_path()}")
     lines.append("tokens: " + api.meter.summary())
-    lines.append(f"tokens_totals: prompt={totals.get('prompt_tokens',0)}, completion={totals.get('completion_tokens',0)}, "
-                 f"cost_usd={float(totals.get('cost_usd',0.0)):.4f}, cost_pln={float(totals.get('cost_pln',0.0)):.2f}")
+    lines.append(f"tokens_totals: prompt={totals.prompt_tokens}, completion={totals.completion_tokens}, "
+                 f"cost_usd={totals.cost_usd:.4f}, cost_pln={totals.cost_pln:.2f}")
     lines.append(f"log_file: {cfg.APP_LOG_FILE}  exists={log_exists}  size={log_size}B  backups={cfg.LOG_BACKUPS}")
 
     # Wybrane pola z sysinfo (żeby nie zalać ekranu)
@@ -797,79 +1179,105 @@ def render_diag(cfg: Config, api) -> str:
 
 # =================== TOKEN METER ===================
 
+@dataclass(slots=True)
+class TokenTotals:
+    """Sumy zużycia trzymane w pamięci; do JSON serializowane dopiero przy zapisie."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    cost_pln: float = 0.0
+    calls: int = 0
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "TokenTotals":
+        return cls(
+            prompt_tokens=int(d.get("prompt_tokens", 0)),
+            completion_tokens=int(d.get("completion_tokens", 0)),
+            cost_usd=float(d.get("cost_usd", 0.0)),
+            cost_pln=float(d.get("cost_pln", 0.0)),
+            calls=int(d.get("calls", 0)),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": self.cost_usd,
+            "cost_pln": self.cost_pln,
+            "calls": self.calls,
+        }
+
+
 class TokenMeter:
     def __init__(self, cfg: Config, logger: RotatingLogger):
         self.cfg = cfg
         self.logger = logger
         self.path = Path(cfg.TOKEN_TOTALS_PATH)
+        self.totals = self._load_totals()
+        self._writes_since_fsync = 0
+        # hash ostatnio zapisanego payloadu — identycznych sum nie zapisujemy ponownie
+        self._last_hash = hash(self._payload(self.totals)) if self.path.exists() else 0
 
-    def _load_totals(self) -> Dict[str, Any]:
+    def _load_totals(self) -> TokenTotals:
         if self.path.exists():
             try:
-                return json.loads(self.path.read_text(encoding="utf-8"))
+                return TokenTotals.from_dict(json.loads(self.path.read_text(encoding="utf-8")))
             except Exception:
-                return {}
-        return {}
-
-    def _save_totals(self, totals: Dict[str, Any]) -> None:
-        self.path.write_text(json.dumps(totals, indent=2, ensure_ascii=False), encoding="utf-8")
-
-    def add_usage(self, model: str, prompt_tokens: int, completion_tokens: int, note: str = "") -> None:
-        totals = self._load_totals()
-        pt = int(totals.get("prompt_tokens", 0)) + prompt_tokens
-        ct = int(totals.get("completion_tokens", 0)) + completion_tokens
-        usd_in = self.cfg.MODEL_PRICING.get(model, {}).get("input_per_1k", 0.0)
-        usd_out = self.cfg.MODEL_PRICING.get(model, {}).get("output_per_1k", 0.0)
-        cost_usd = float(totals.get("cost_usd", 0.0)) + (prompt_tokens / 1000) * usd_in + (completion_tokens / 1000) * usd_out
-        cost_pln = cost_usd * self.cfg.USD_TO_PLN
-        calls = int(totals.get("calls", 0)) + 1
-        totals.update(
-            prompt_tokens=pt,
-            completion_tokens=ct,
-            cost_usd=cost_usd,
-            cost_pln=cost_pln,
-            calls=calls,
-        )
-        self._save_totals(totals)
+                return TokenTotals()
+        return TokenTotals()
+
+    @staticmethod
+    def _payload(totals: TokenTotals) -> str:
+        return json.dumps(totals.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    def _save_totals(self, totals: TokenTotals, force_fsync: bool = False) -> None:
+        payload = self._payload(totals)
+        h = hash(payload)
+        if h == self._last_hash:
+            return
+        self._writes_since_fsync += 1
+        fsync = force_fsync or self._writes_since_fsync >= self.cfg.TOKEN_FSYNC_EVERY
+        _atomic_write_text(self.path, payload, fsync=fsync)
+        self._last_hash = h
+        if fsync:
+            self._writes_since_fsync = 0
+
+    def add_usage(self, model: str, prompt_tokens: int, completion_tokens: int, note: str = "",
+                  price_factor: float = 1.0) -> None:
+        t = self.totals
+        pricing = self.cfg.MODEL_PRICING.get(model, {})
+        usd_in = pricing.get("input_per_1k", 0.0) * price_factor
+        usd_out = pricing.get("output_per_1k", 0.0) * price_factor
+        t.prompt_tokens += prompt_tokens
+        t.completion_tokens += completion_tokens
+        t.cost_usd += (prompt_tokens / 1000) * usd_in + (completion_tokens / 1000) * usd_out
+        t.cost_pln = t.cost_usd * self.cfg.USD_TO_PLN
+        t.calls += 1
+        self._save_totals(t)
         self.logger.log("tokens.update",
                         model=model,
                         prompt_tokens=prompt_tokens,
                         completion_tokens=completion_tokens,
-                        cost_usd=cost_usd,
-                        cost_pln=cost_pln,
+                        cost_usd=t.cost_usd,
+                        cost_pln=t.cost_pln,
                         note=note)
 
     def summary(self) -> str:
-        t = self._load_totals()
-        pt = int(t.get("prompt_tokens", 0))
-        ct = int(t.get("completion_tokens", 0))
-        usd = float(t.get("cost_usd", 0.0))
-        pln = float(t.get("cost_pln", 0.0))
-        calls = int(t.get("calls", 0))
-        total_tokens = pt + ct
-        avg_tokens = (total_tokens / calls) if calls else 0.0
-        return f"🔢 Tokeny: prompt={pt}, completion={ct} | 💵 Koszt: {usd:.4f} USD ~ {pln:.2f} PLN | 📞 Wywołań: {calls}, Średnio/tokeny: {avg_tokens:.1f}"
+        t = self.totals
+        total_tokens = t.prompt_tokens + t.completion_tokens
+        avg_tokens = (total_tokens / t.calls) if t.calls else 0.0
+        return f"🔢 Tokeny: prompt={t.prompt_tokens}, completion={t.completion_tokens} | 💵 Koszt: {t.cost_usd:.4f} USD ~ {t.cost_pln:.2f} PLN | 📞 Wywołań: {t.calls}, Średnio/tokeny: {avg_tokens:.1f}"
 
     def reset(self):
         """Wyzeruj liczniki zużycia (sumy w JSON)."""
-        totals = {
-            "prompt_tokens": 0,
-            "completion_tokens": 0,
-            "cost_usd": 0.0,
-            "cost_pln": 0.0,
-            "calls": 0
-        }
-        self._save_totals(totals)
+        self.totals = TokenTotals()
+        self._save_totals(self.totals, force_fsync=True)
         self.logger.log("tokens.reset")
 
     def report(self) -> str:
         """Szczegółowy raport użycia tokenów."""
-        t = self._load_totals()
-        pt = int(t.get("prompt_tokens", 0))
-        ct = int(t.get("completion_tokens", 0))
-        usd = float(t.get("cost_usd", 0.0))
-        pln = float(t.get("cost_pln", 0.0))
-        calls = int(t.get("calls", 0))
+        t = self.totals
+        pt, ct, usd, pln, calls = t.prompt_tokens, t.completion_tokens, t.cost_usd, t.cost_pln, t.calls
         total_tokens = pt + ct
         avg_tokens = (total_tokens / calls) if calls else 0.0
         return (
@@ -884,18 +1292,38 @@ class TokenMeter:
 
 # =================== PROJECTS + SANDBOX ===================
 
+_SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_\-]")
+_MOD_NAME_OK = frozenset(string.ascii_letters + string.digits + "_-")
+
 class ProjectManager:
     def __init__(self, cfg: Config):
         self.cfg = cfg
         ensure_dirs(cfg)
+        # (mtime pliku .current, nazwa) — odczyt z dysku tylko gdy plik się zmienił
+        self._cur_cache: Optional[Tuple[float, str]] = None
 
     def _cur_file(self) -> Path:
         return Path(self.cfg.CURRENT_PROJECT_FILE)
 
+    def _set_current(self, name: str) -> None:
+        cur = self._cur_file()
+        _atomic_write_text(cur, name)
+        try:
+            self._cur_cache = (cur.stat().st_mtime, name)
+        except OSError:
+            self._cur_cache = None
+
     def current_name(self) -> str:
         try:
-            return self._cur_file().read_text(encoding="utf-8").strip() or "default"
+            cur = self._cur_file()
+            mtime = cur.stat().st_mtime
+            if self._cur_cache is not None and self._cur_cache[0] == mtime:
+                return self._cur_cache[1]
+            name = cur.read_text(encoding="utf-8").strip() or "default"
+            self._cur_cache = (mtime, name)
+            return name
         except Exception:
+            self._cur_cache = None
             return "default"
 
     def current_path(self) -> Path:
@@ -905,18 +1333,18 @@ class ProjectManager:
         return sorted([p.name for p in Path(self.cfg.PROJECTS_DIR).iterdir() if p.is_dir()])
 
     def new(self, name: str) -> str:
-        safe = re.sub(r"[^A-Za-z0-9_\-]", "_", name).strip("_") or "proj"
+        safe = _SAFE_NAME_RE.sub("_", name).strip("_") or "proj"
         path = Path(self.cfg.PROJECTS_DIR) / safe
         path.mkdir(parents=True, exist_ok=True)
-        self._cur_file().write_text(safe, encoding="utf-8")
+        self._set_current(safe)
         return safe
 
     def open(self, name: str) -> bool:
-        safe = re.sub(r"[^A-Za-z0-9_\-]", "_", name).strip("_")
+        safe = _SAFE_NAME_RE.sub("_", name).strip("_")
         path = Path(self.cfg.PROJECTS_DIR) / safe
         if not path.is_dir():
             return False
-        self._cur_file().write_text(safe, encoding="utf-8")
+        self._set_current(safe)
         return True
 
 class GitManager:
@@ -1020,7 +1448,7 @@ class FileOps:
             if not self._is_safe(rp):
                 return False
             rp.parent.mkdir(parents=True, exist_ok=True)
-            rp.write_text(content, encoding="utf-8")
+            _atomic_write_text(rp, content)
             return True
         except Exception:
             return False
@@ -1093,11 +1521,7 @@ class CommandExecutor:
 
         # Opcjonalne ostrzeżenie od walidatora
         if warn:
-            try:
-                with open(self.cfg.RUN_ERR_FILE, "a", encoding="utf-8") as f:
-                    f.write(f"[{ts}] WARN: {warn} for: {cmd}\n")
-            except Exception:
-                pass
+            _LOG_WRITER.append(self.cfg.RUN_ERR_FILE, f"[{ts}] WARN: {warn} for: {cmd}\n")
 
         self.logger.log("exec.run", cmd=cmd)
         try:
@@ -1107,60 +1531,52 @@ class CommandExecutor:
                 check=False,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
                 timeout=self.cfg.EXEC_TIMEOUT,
             )
 
-            stdout = p.stdout or ""
-            stderr = p.stderr or ""
-            out = stdout if p.returncode == 0 else (stderr or stdout)
-
-            # Log do plików OUT/ERR
-            try:
-                if p.returncode == 0:
-                    if stdout:
-                        with open(self.cfg.RUN_OUT_FILE, "a", encoding="utf-8") as f:
-                            f.write(f"[{ts}] CMD: {cmd}\n{stdout}\n---\n")
-                    if stderr:
-                        with open(self.cfg.RUN_ERR_FILE, "a", encoding="utf-8") as f:
-                            f.write(f"[{ts}] STDERR (rc=0) CMD: {cmd}\n{stderr}\n---\n")
-                else:
-                    with open(self.cfg.RUN_ERR_FILE, "a", encoding="utf-8") as f:
-                        f.write(f"[{ts}] ERROR rc={p.returncode} CMD: {cmd}\n{out}\n---\n")
-            except Exception:
-                # Ciche — nie blokujemy wykonania, jeśli log się nie powiedzie
-                pass
+            # surowe bajty: długość do logu bez ponownego kodowania, dekodujemy raz
+            stdout_b = p.stdout or b""
+            stderr_b = p.stderr or b""
+            out_b = stdout_b if p.returncode == 0 else (stderr_b or stdout_b)
+            stdout = stdout_b.decode("utf-8", "replace")
+            stderr = stderr_b.decode("utf-8", "replace") if stderr_b else ""
+            out = stdout if out_b is stdout_b else stderr
 
-            self.logger.log("exec.done", cmd=cmd, rc=p.returncode, bytes=len((out or "").encode("utf-8")))
+            # Log do plików OUT/ERR (asynchronicznie, przez wątek logów)
+            if p.returncode == 0:
+                if stdout:
+                    _LOG_WRITER.append(self.cfg.RUN_OUT_FILE, f"[{ts}] CMD: {cmd}\n{stdout}\n---\n")
+                if stderr:
+                    _LOG_WRITER.append(self.cfg.RUN_ERR_FILE, f"[{ts}] STDERR (rc=0) CMD: {cmd}\n{stderr}\n---\n")
+            else:
+                _LOG_WRITER.append(self.cfg.RUN_ERR_FILE, f"[{ts}] ERROR rc={p.returncode} CMD: {cmd}\n{out}\n---\n")
+
+            self.logger.log("exec.done", cmd=cmd, rc=p.returncode, bytes=len(out_b))
             if p.returncode == 0:
                 return True, stdout
             return False, out
 
         except subprocess.TimeoutExpired:
-            try:
-                with open(self.cfg.RUN_ERR_FILE, "a", encoding="utf-8") as f:
-                    f.write(f"[{ts}] TIMEOUT after {self.cfg.EXEC_TIMEOUT}s CMD: {cmd}\n---\n")
-            except Exception:
-                pass
+            _LOG_WRITER.append(self.cfg.RUN_ERR_FILE, f"[{ts}] TIMEOUT after {self.cfg.EXEC_TIMEOUT}s CMD: {cmd}\n---\n")
             self.logger.log("exec.timeout", cmd=cmd)
             return False, "⏰ Przekroczono limit czasu wykonania"
 
         except Exception as e:
-            try:
-                with open(self.cfg.RUN_ERR_FILE, "a", encoding="utf-8") as f:
-                    f.write(f"[{ts}] EXCEPTION CMD: {cmd}\n{str(e)}\n---\n")
-            except Exception:
-                pass
+            _LOG_WRITER.append(self.cfg.RUN_ERR_FILE, f"[{ts}] EXCEPTION CMD: {cmd}\n{str(e)}\n---\n")
             self.logger.log("exec.error", cmd=cmd, error=str(e))
             return False, str(e)
 
 # =================== LLM HELPERS (code preflight / sanitize) ===================
 
-def extract_imports(code: str) -> List[str]:
-    try:
-        tree = ast.parse(code)
-    except SyntaxError:
-        return []
+_STDLIB_FALLBACK = frozenset({
+    "sys","os","time","re","json","random","datetime","pathlib","subprocess",
+    "select","socket","termios","tty","signal","shutil","tempfile","logging",
+    "itertools","functools","collections","argparse","typing","enum","dataclasses",
+    "hashlib","importlib","urllib","ast","traceback",
+})
+
+
+def _imports_from_tree(tree: ast.AST) -> List[str]:
     mods = set()
     for node in ast.walk(tree):
         if isinstance(node, ast.Import):
@@ -1172,36 +1588,56 @@ def extract_imports(code: str) -> List[str]:
     return sorted(mods)
 
 
-def missing_third_party(code: str) -> List[str]:
-    mods = extract_imports(code)
+@functools.lru_cache(maxsize=512)
+def _is_missing_module(m: str) -> bool:
     std = getattr(sys, "stdlib_module_names", None)
-    missing = []
-    for m in mods:
-        if std is not None and m in std:
-            continue
-        if std is None and m in {
-            "sys","os","time","re","json","random","datetime","pathlib","subprocess",
-            "select","socket","termios","tty","signal","shutil","tempfile","logging",
-            "itertools","functools","collections","argparse","typing","enum","dataclasses",
-            "hashlib","importlib","urllib","ast","traceback",
-        }:
-            continue
-        if importlib.util.find_spec(m) is None:
-            missing.append(m)
-    return missing
+    if m in (std if std is not None else _STDLIB_FALLBACK):
+        return False
+    return importlib.util.find_spec(m) is None
 
 
-def compile_check(code: str) -> Optional[str]:
+def analyze_code(code: str) -> Tuple[Optional[str], List[str]]:
+    """
+    Jedno ast.parse → (błąd składni albo None, brakujące moduły spoza stdlib).
+    Tylko parsowanie, bez generowania bajtkodu; błędy z etapu kompilacji
+    (np. 'return' poza funkcją) wychodzą przy uruchomieniu i idą w runtime-fix.
+    """
     try:
-        compile(code, "<generated>", "exec")
-        return None
+        tree = ast.parse(code, "<generated>", "exec")
     except SyntaxError as e:
-        return f"SyntaxError: {e.msg} (line {e.lineno}, col {e.offset})"
+        return f"SyntaxError: {e.msg} (line {e.lineno}, col {e.offset})", []
+    return None, [m for m in _imports_from_tree(tree) if _is_missing_module(m)]
+
+
+def extract_imports(code: str) -> List[str]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    return _imports_from_tree(tree)
+
+
+def missing_third_party(code: str) -> List[str]:
+    return [m for m in extract_imports(code) if _is_missing_module(m)]
+
+
+def compile_check(code: str) -> Optional[str]:
+    return analyze_code(code)[0]
+
+
+_BASH_FENCE_RE = re.compile(r"```(?:bash|sh)?\s*([\s\S]*?)```", re.IGNORECASE)
+
+
+def _is_command_answer(answer: str) -> bool:
+    """Odpowiedź, którą ask_ai(execute=True) uruchomiłby jako komendę."""
+    return answer.lower().startswith("wykonaj:") or bool(_BASH_FENCE_RE.search(answer))
+_PY_FENCE_RE = re.compile(r"```(?:python|py)\s*([\s\S]*?)```", re.IGNORECASE)
+_ANY_FENCE_RE = re.compile(r"```+\s*([\s\S]*?)```+")
 
 
 def sanitize_llm_code(raw: str) -> str:
-    m_py = re.search(r"```(?:python|py)\s*([\s\S]*?)```", raw, re.IGNORECASE)
-    m_any = re.search(r"```+\s*([\s\S]*?)```+", raw) if not m_py else None
+    m_py = _PY_FENCE_RE.search(raw)
+    m_any = _ANY_FENCE_RE.search(raw) if not m_py else None
     code = (m_py.group(1) if m_py else (m_any.group(1) if m_any else raw)).strip()
     cleaned = []
     for line in code.splitlines():
@@ -1237,10 +1673,19 @@ def repair_prompt(original_code: str, error_text: str, missing_mods: List[str])
 PROMPT_RULES_FILE = os.path.expanduser("~/HALbridge/prompt_rules.txt")
 
 
+_PROMPT_RULES_CACHE: Tuple[int, list] = (-1, [])  # (mtime_ns, reguły)
+
+
 def load_persistent_prompt_rules() -> list[str]:
+    """Reguły z PROMPT_RULES_FILE; plik czytany ponownie tylko po zmianie mtime."""
+    global _PROMPT_RULES_CACHE
     try:
-        if not os.path.exists(PROMPT_RULES_FILE):
+        try:
+            mtime = os.stat(PROMPT_RULES_FILE).st_mtime_ns
+        except FileNotFoundError:
             return []
+        if _PROMPT_RULES_CACHE[0] == mtime:
+            return _PROMPT_RULES_CACHE[1]
         rules: list[str] = []
         with open(PROMPT_RULES_FILE, "r", encoding="utf-8") as f:
             for line in f:
@@ -1250,6 +1695,7 @@ def load_persistent_prompt_rules() -> list[str]:
                 if line.startswith("#"):
                     continue
                 rules.append(line)
+        _PROMPT_RULES_CACHE = (mtime, rules)
         return rules
     except Exception:
         return []
@@ -1257,18 +1703,39 @@ def load_persistent_prompt_rules() -> list[str]:
 
 # =================== NETWORK TOOL (SAFE HTTP GET) ===================
 
+@functools.lru_cache(maxsize=256)
+def _url_host(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
 class HttpTool:
     def __init__(self, cfg: Config, logger: RotatingLogger):
         self.cfg = cfg
         self.logger = logger
+        self._rebuild_allowlist()
+
+    def _rebuild_allowlist(self) -> None:
+        """Zamraża whitelistę: dokładne hosty + krotka sufiksów '.dom' dla endswith()."""
+        self._allow_exact = frozenset(self.cfg.NET_ALLOWED)
+        self._allow_suffixes = tuple("." + d for d in self._allow_exact)
+
+    def allow(self, dom: str) -> None:
+        self.cfg.NET_ALLOWED.add(dom)
+        self._rebuild_allowlist()
+
+    def deny(self, dom: str) -> bool:
+        if dom not in self.cfg.NET_ALLOWED:
+            return False
+        self.cfg.NET_ALLOWED.remove(dom)
+        self._rebuild_allowlist()
+        return True
 
     def _allowed_domain(self, url: str) -> Tuple[bool, str]:
         try:
-            p = urlparse(url)
-            host = (p.hostname or "").lower()
+            host = _url_host(url)
             if not host:
                 return False, "❌ Nieprawidłowy URL"
-            allowed_any = any(host == dom or host.endswith("." + dom) for dom in self.cfg.NET_ALLOWED)
+            allowed_any = host in self._allow_exact or host.endswith(self._allow_suffixes)
             return (self.cfg.ENABLE_NETWORK_OPS and allowed_any), host
         except Exception:
             return False, "❌ Nieprawidłowy URL"
@@ -1308,40 +1775,6 @@ class HttpTool:
         except Exception as e:
             return f"❌ Błąd HTTP: {e}"
 
-class ModuleRunner:
-    """Bezpieczne uruchamianie modułów w katalogu modules/"""
-
-    def __init__(self, cfg: Config, logger: RotatingLogger):
-        self.cfg = cfg
-        self.logger = logger
-        self.base = Path("modules").resolve()
-
-    def run(self, name: str, args: List[str] = None) -> str:
-        if not re.match(r"^[A-Za-z0-9_\-]+$", name):
-            return "❌ Niedozwolona nazwa modułu."
-        script = self.base / (name + ".py")
-        if not script.exists():
-            return f"❌ Brak modułu: {script}"
-        # Spróbuj najpierw rozpoznać komendę sprzętową
-        hw_result = bridge.execute(name)
-        if hw_result:
-            print(f"[HARDWARE] {hw_result}")
-            return hw_result
-        cmd = ["python3", str(script)] + (args or [])
-        try:
-            p = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=30,
-            )
-            out = p.stdout if p.returncode == 0 else (p.stderr or p.stdout)
-            self.logger.log("module.run", module=name, rc=p.returncode, bytes=len(out.encode("utf-8")))
-            return out.strip()
-        except Exception as e:
-            return f"❌ Błąd modułu: {e}"
-
 # =================== MODULE RUNNER ===================
 class ModuleRunner:
     """
@@ -1377,10 +1810,7 @@ class ModuleRunner:
                 mods.append(p.name)
         return sorted(mods)
 
-    def run(self, name: str, args: str = "") -> Tuple[bool, str]:
-        mf = self._module_file(name)
-        if not mf:
-            return False, f"❌ Brak modułu: {self.base / (name + '.py')}"
+    def _call_main(self, name: str, mf: Path, argv: List[str]) -> Tuple[bool, str]:
         try:
             spec = importlib.util.spec_from_file_location(f"modules.{name}", mf)
             if not spec or not spec.loader:
@@ -1389,12 +1819,40 @@ class ModuleRunner:
             spec.loader.exec_module(mod)  # type: ignore[attr-defined]
             if not hasattr(mod, "main"):
                 return False, "❌ Moduł nie ma funkcji main(args)"
-            argv = shlex.split(args) if isinstance(args, str) else (args or [])
             res = mod.main(argv)
             return True, str(res) if res is not None else "✅ OK"
         except Exception as e:
             return False, f"❌ Błąd modułu: {e}"
 
+    def run(self, name: str, args: str = "") -> Tuple[bool, str]:
+        """
+        Uruchamia moduł w bieżącym interpreterze (bez startu nowego python3).
+        main(args) działa w wątku roboczym; po MODULE_TIMEOUT sekundach
+        zwracamy błąd, a wątek (daemon) zostaje porzucony.
+        """
+        if not name or not _MOD_NAME_OK.issuperset(name):
+            return False, "❌ Niedozwolona nazwa modułu."
+        mf = self._module_file(name)
+        if not mf:
+            return False, f"❌ Brak modułu: {self.base / (name + '.py')}"
+        argv = shlex.split(args) if isinstance(args, str) else (args or [])
+
+        result: List[Tuple[bool, str]] = []
+        worker = threading.Thread(
+            target=lambda: result.append(self._call_main(name, mf, argv)),
+            name=f"module-{name}",
+            daemon=True,
+        )
+        t0 = time.monotonic()
+        worker.start()
+        worker.join(self.cfg.MODULE_TIMEOUT)
+        if worker.is_alive():
+            self.logger.log("module.timeout", module=name, timeout=self.cfg.MODULE_TIMEOUT)
+            return False, f"⏰ Moduł {name} przekroczył limit {self.cfg.MODULE_TIMEOUT}s"
+        ok, out = result[0] if result else (False, "❌ Błąd modułu: brak wyniku")
+        self.logger.log("module.run", module=name, ok=ok, ms=int((time.monotonic() - t0) * 1000))
+        return ok, out
+
     def info(self, name: str) -> str:
         mf = self._module_file(name)
         if not mf:
@@ -1411,27 +1869,61 @@ class ModuleRunner:
             return f"❌ Błąd info: {e}"
 
 # =================== GPTChatAPI (LLM + pamięć + tokeny + projekty + logi + sieć) ===================
+_DIRECT_READ_TOOLS = frozenset({"file_access", "file_chunk", "dir_list"})
+
+
+def _browser_query_tool(args: dict):
+    # bs4 ładowane dopiero przy pierwszym browser_query
+    from modules.tools.browser_mode import perform_browser_query
+    return perform_browser_query(args["url"], args["html"])
+
+
 class GPTChatAPI:
+    # nazwa narzędzia → wywołanie; jedna tabela zamiast łańcucha if/elif w ask_ai
+    TOOL_DISPATCH = {
+        "web_fetch": lambda a: registry.invoke("web_fetch", a),
+        "browser_query": lambda a: _browser_query_tool(a),
+        "file_access": lambda a: registry.invoke("file_access", a),
+        "dir_list": lambda a: registry.invoke("dir_list", a),
+        "file_search": lambda a: registry.invoke("file_search", a),
+        "file_chunk": lambda a: registry.invoke("file_chunk", a),
+        "file_write": lambda a: registry.invoke("file_write", a),
+    }
+
     def __init__(self, cfg: Config, session_id: str = "default"):
         self.cfg = cfg
         ensure_dirs(cfg)
         self.logger = RotatingLogger(cfg)
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if OpenAI and os.getenv("OPENAI_API_KEY") else None
+        self._client = None  # klient OpenAI tworzony leniwie (patrz: client)
         self.validator = CommandValidator(cfg)
         self.exec = CommandExecutor(cfg, self.logger)
         self.projects = ProjectManager(cfg)
         self.files = FileOps(cfg, self.projects)
         self.memory = MemoryStore(cfg)
+        self.resp_cache = ResponseCache(cfg)
         self.meter = TokenMeter(cfg, self.logger)
+        self.sem_cache = SemanticCache(cfg, self.logger)
         self.http = HttpTool(cfg, self.logger)
         self.git = GitManager(cfg, self.projects, self.logger)
         self.session_id = session_id
         self.memory.ensure_session(session_id)
         self.logger.log("agent.start", model=cfg.OPENAI_MODEL, usd_to_pln=cfg.USD_TO_PLN)
         self.modules = ModuleRunner(cfg, self.logger)
-
-    # --------- Prompt budowany z pamięci i streszczeń ---------
-    def _system_prompt(self) -> str:
+        self._check_prefix()
+
+    @property
+    def client(self):
+        """Klient OpenAI budowany dopiero przy pierwszym wywołaniu LLM."""
+        if self._client is None and OpenAI and os.getenv("OPENAI_API_KEY"):
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    # --------- Prompt: stały prefiks + dynamiczny kontekst ---------
+    # Prefiks (reguły) jest bajtowo identyczny w każdej turze, więc dostawca
+    # może go cache'ować; wszystko, co się zmienia, idzie za historią.
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _static_system_prompt() -> str:
         rules = [
             "Jesteś asystentem terminalowym i helperem do generowania kodu.",
             "Zasady:",
@@ -1472,11 +1964,43 @@ class GPTChatAPI:
             "Jeśli użytkownik chce modyfikacji kodu, użyj file_write.",
             "Nigdy nie zgaduj treści plików — zawsze pobieraj je narzędziami.",
         ]
+        return "\n".join(rules)
+
+    def _check_prefix(self) -> None:
+        """
+        Porównuje stały prefiks (system + tools) z zapisanym przy poprzednim
+        uruchomieniu. Identyczny prefiks = trafienia w prefix cache dostawcy
+        także po restarcie; zmianę odnotowujemy w logu i nadpisujemy plik.
+        """
+        prefix = self._static_system_prompt() + "\n" + json.dumps(
+            self._tools_schema, ensure_ascii=False, sort_keys=True
+        )
+        path = Path(self.cfg.PREFIX_FILE).expanduser()
+        try:
+            old = path.read_text(encoding="utf-8")
+        except OSError:
+            old = None
+        changed = old != prefix
+        self.logger.log(
+            "llm.prefix",
+            sha256=hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16],
+            changed=changed,
+        )
+        if changed:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _atomic_write_text(path, prefix)
+            except OSError as e:
+                self.logger.log("llm.prefix.error", error=str(e))
+
+    def _dynamic_context(self) -> str:
+        """Reguły z pliku, fakty pinned i streszczenie — zmienne między turami."""
+        rules: List[str] = []
 
         # --- Stałe, użytkownikowe reguły z pliku ---
         extra_rules = load_persistent_prompt_rules()
         if extra_rules:
-            rules.append("\nDodatkowe stałe reguły zachowania (z pliku):")
+            rules.append("Dodatkowe stałe reguły zachowania (z pliku):")
             for r in extra_rules:
                 rules.append(r)
 
@@ -1489,14 +2013,50 @@ class GPTChatAPI:
         if summary:
             rules.append("\nStreszczenie dotychczasowej rozmowy:")
             rules.append(summary[: self.cfg.SUMMARY_MAX_CHARS])
-        return "\n".join(rules)
+        return "\n".join(rules).strip()
+
+    def _build_messages(self, prompt: str, history: List[Dict]) -> List[Dict]:
+        """[stały system] + historia + [dynamiczny system] + [user] — ta sama kolejność w każdym wywołaniu."""
+        msgs = [{"role": "system", "content": self._static_system_prompt()}]
+        msgs += history
+        dynamic = self._dynamic_context()
+        if dynamic:
+            msgs.append({"role": "system", "content": dynamic})
+        msgs.append({"role": "user", "content": prompt})
+        return msgs
+
+    def _messages_for(self, prompt: str) -> List[Dict]:
+        """
+        _build_messages z historią przyciętą do budżetu tokenów
+        (OPENAI_MAX_CTX - OPENAI_MAX_TOKENS - zapas). Przy przekroczeniu
+        wymusza streszczenie i odrzuca najstarsze wiadomości historii.
+        """
+        history = self.memory.get_recent_messages(self.session_id, limit=10)
+        msgs = self._build_messages(prompt, history)
+        model = self.cfg.OPENAI_MODEL
+        budget = self.cfg.OPENAI_MAX_CTX - self.cfg.OPENAI_MAX_TOKENS - 512
+        sizes = [count_tokens(m.get("content") or "", model) for m in msgs]
+        total = sum(sizes)
+        if total <= budget:
+            return msgs
+
+        self.logger.log("llm.context.trim", tokens=total, budget=budget, history=len(history))
+        self._maybe_autosummarize(force=True)
+        msgs = self._build_messages(prompt, history)   # nowe streszczenie w kontekście
+        hist_sizes = sizes[1:1 + len(history)]
+        total = sum(count_tokens(m.get("content") or "", model) for m in msgs)
+        drop = 0
+        while drop < len(history) and total > budget:
+            total -= hist_sizes[drop]
+            drop += 1
+        return self._build_messages(prompt, history[drop:])
 
     # --------- Autostreszczenia po N wiadomościach ---------
-    def _maybe_autosummarize(self):
+    def _maybe_autosummarize(self, force: bool = False):
         if not self.client:
             return
         cnt = self.memory.count_since_summary(self.session_id)
-        if cnt < self.cfg.SUMMARY_MSG_THRESHOLD:
+        if cnt < self.cfg.SUMMARY_MSG_THRESHOLD and not (force and cnt):
             return
         last_id, _ = self.memory.last_summary(self.session_id)
         msgs = self.memory.get_messages_since(self.session_id, last_id, limit=self.cfg.SUMMARY_WINDOW)
@@ -1539,6 +2099,7 @@ class GPTChatAPI:
             self.logger.log("memory.summary.error", error=str(e))
 
 # --------- Deklaracja narzędzi (tools) dla GPT API ---------
+    @functools.cached_property
     def _tools_schema(self):
         return [
             {
@@ -1629,13 +2190,16 @@ class GPTChatAPI:
     "type": "function",
     "function": {
         "name": "file_chunk",
-        "description": "Czyta fragment pliku od podanego offsetu",
+        "description": (
+            "Czyta fragment pliku od podanego offsetu. offset i size są w BAJTACH (UTF-8), "
+            "granice wyrównane do pełnych znaków; kolejny fragment czytaj od zwróconego next_offset."
+        ),
         "parameters": {
             "type": "object",
             "properties": {
                 "path": {"type": "string"},
-                "offset": {"type": "integer"},
-                "size": {"type": "integer"}
+                "offset": {"type": "integer", "description": "offset w bajtach"},
+                "size": {"type": "integer", "description": "maks. liczba bajtów"}
             },
             "required": ["path"]
         }
@@ -1659,14 +2223,83 @@ class GPTChatAPI:
         ]
 
 # --------- LLM interakcje ---------
-    def ask_ai(self, prompt: str, *, execute: bool = True, note: str = "") -> str:
+    def _stream_chat(self, echo: bool = False, **kwargs) -> Tuple[str, Tuple[List[str], List[str], List[str]], Any]:
+        """
+        chat.completions.create(stream=True): składa treść i tool_calls z delt.
+        echo=True wypisuje tekst na stdout na bieżąco. Ctrl-C zamyka strumień.
+        Zwraca (answer, (ids, names, arguments), usage) — tool_calls kolumnami.
+        """
+        stream = self.client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        buf: List[str] = []
+        acc: Dict[int, Dict[str, Any]] = {}
+        usage = None
+        try:
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    buf.append(delta.content)
+                    if echo:
+                        sys.stdout.write(delta.content)
+                        sys.stdout.flush()
+                for tc in delta.tool_calls or ():
+                    slot = acc.setdefault(tc.index, {"id": "", "name": "", "arguments": []})
+                    if tc.id:
+                        slot["id"] = tc.id
+                    fn = tc.function
+                    if fn is not None:
+                        if fn.name:
+                            slot["name"] += fn.name
+                        if fn.arguments:
+                            slot["arguments"].append(fn.arguments)
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+        order = sorted(acc)
+        ids = [acc[i]["id"] for i in order]
+        names = [acc[i]["name"] for i in order]
+        args = ["".join(acc[i]["arguments"]) for i in order]
+        return "".join(buf).strip(), (ids, names, args), usage
+
+    def _run_tool(self, name: str, arguments: str) -> Any:
+        """Wykonuje jeden tool-call; błędy zamienia na {"error": ...}."""
+        fn = self.TOOL_DISPATCH.get(name)
+        try:
+            args = _jloads(arguments)
+            return fn(args) if fn else {"error": f"Unknown tool {name}"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _tool_text(out: Any) -> str:
+        """Wynik narzędzia jako tekst dla modelu."""
+        if isinstance(out, (dict, list)):
+            return _jdumps(out)
+        return str(out)
+
+    @staticmethod
+    def _tool_error(out: Any) -> Optional[str]:
+        if isinstance(out, dict) and out.get("error") and not out.get("ok"):
+            return str(out["error"])
+        return None
+
+    def ask_ai(self, prompt: str, *, execute: bool = True, note: str = "", stream: bool = False) -> str:
+        """stream=True: tekst odpowiedzi trafia na stdout na bieżąco (i jest też zwracany)."""
         if not self.client:
-            return f"🔌 [Offline] Brak OPENAI_API_KEY. Prompt: {prompt}"
+            offline = f"🔌 [Offline] Brak OPENAI_API_KEY. Prompt: {prompt}"
+            if stream:
+                print(offline, end="")
+            return offline
 
-        # --- Budowa wiadomości ---
-        msgs = [{"role": "system", "content": self._system_prompt()}]
-        msgs += self.memory.get_recent_messages(self.session_id, limit=10)
-        msgs.append({"role": "user", "content": prompt})
+        # --- Budowa wiadomości (historia w budżecie tokenów) ---
+        msgs = self._messages_for(prompt)
 
         # --- Log: request ---
         self.logger.log(
@@ -1676,126 +2309,132 @@ class GPTChatAPI:
             prompt_len=len(prompt)
         )
 
-        # --- Call LLM z narzędziami ---
-        resp = self.client.chat.completions.create(
-            model=self.cfg.OPENAI_MODEL,
-            temperature=self.cfg.OPENAI_TEMPERATURE,
-            max_tokens=self.cfg.OPENAI_MAX_TOKENS,
-            messages=msgs,
-            tools=self._tools_schema(),
-            tool_choice="auto",
-        )
-
-        # Odpowiedź może być None
-        answer = resp.choices[0].message.content
-        answer = answer.strip() if answer else ""
+        tools = self._tools_schema
 
-        # --- Obsługa tool-calls ---
-        tool_calls = getattr(resp.choices[0].message, "tool_calls", None)
-        if tool_calls:
-
-            assistant_msg = {
-                "role": "assistant",
+        # --- Cache: identyczne (model, parametry, wiadomości, narzędzia) → bez wywołania API ---
+        cache_key = None
+        cached = None
+        if self.cfg.ENABLE_RESP_CACHE:
+            cache_key = ResponseCache.key(
+                self.cfg.OPENAI_MODEL, self.cfg.OPENAI_TEMPERATURE, self.cfg.OPENAI_MAX_TOKENS, msgs, tools
+            )
+            cached = self.resp_cache.get(cache_key)
+
+        # --- Cache semantyczny: parafrazy tego samego pytania (bez promptów z kodem) ---
+        # Nigdy przy execute=True: „usuń plik a.txt” ≈ „usuń plik b.txt”, a odpowiedź
+        # z cache poszłaby do auto-wykonania. Klucz obejmuje też kontekst rozmowy.
+        sem_vec = None
+        sem_ctx = ""
+        if cached is None and not execute and self.sem_cache.enabled and not note.startswith("code_"):
+            try:
+                sem_ctx = SemanticCache.context_key(msgs)
+                sem_vec, emb_tokens = self.sem_cache.embed(self.client, prompt)
+                self.meter.add_usage(
+                    model=self.cfg.SEM_CACHE_MODEL,
+                    prompt_tokens=emb_tokens,
+                    completion_tokens=0,
+                    note="semcache",
+                )
+                cached = self.sem_cache.lookup(sem_vec, sem_ctx)
+            except Exception as e:
+                self.logger.log("semcache.error", error=str(e))
+                sem_vec = None
+
+        fresh = cached is None
+        usage = None
+        if not fresh:
+            self.logger.log("llm.cache.hit", model=self.cfg.OPENAI_MODEL, note=note)
+            answer = cached
+            tool_calls = ([], [], [])
+            if stream:
+                print(answer, end="")
+        else:
+            # --- Call LLM z narzędziami (strumieniowo) ---
+            answer, tool_calls, usage = self._stream_chat(
+                echo=stream,
+                model=self.cfg.OPENAI_MODEL,
+                temperature=self.cfg.OPENAI_TEMPERATURE,
+                max_tokens=self.cfg.OPENAI_MAX_TOKENS,
+                messages=msgs,
+                tools=tools,
+                tool_choice="auto",
+            )
+
+        # --- Obsługa tool-calls (wyniki narzędzi nie trafiają do cache) ---
+        ids, names, args = tool_calls
+        if ids:
+            final_messages = list(msgs)
+            final_messages.append({
+                "role": "assistant",
                 "content": answer,
                 "tool_calls": [
-                    {
-                        "id": call.id,
-                        "type": "function",
-                        "function": {
-                            "name": call.function.name,
-                            "arguments": call.function.arguments,
-                        },
-                    }
-                    for call in tool_calls
+                    {"id": i, "type": "function", "function": {"name": n, "arguments": a}}
+                    for i, n, a in zip(ids, names, args)
                 ],
-            }
-
-            final_messages = [
-                {"role": "system", "content": self._system_prompt()},
-            ]
-
-            final_messages += self.memory.get_recent_messages(self.session_id, limit=10)
-            final_messages.append({"role": "user", "content": prompt})
-            final_messages.append(assistant_msg)
-
-            # wykonanie narzędzi
-            for call in tool_calls:
-                name = call.function.name
-                args = json.loads(call.function.arguments)
-
-                # WEB FETCH
-                if name == "web_fetch":
-                    try:
-                        out = registry.invoke("web_fetch", args)
-                    except Exception as e:
-                        out = {"error": str(e)}
-
-                # BROWSER QUERY
-                elif name == "browser_query":
-                    try:
-                        out = perform_browser_query(args["url"], args["html"])
-                    except Exception as e:
-                        out = {"error": str(e)}
-
-                # FILE ACCESS (czytanie plików)
-                elif name == "file_access":
-                    try:
-                        out = registry.invoke("file_access", args)
-                    except Exception as e:
-                        out = {"error": str(e)}
-
-                # LISTOWANIE FOLDERU
-                elif name == "dir_list":
-                    try:
-                        out = registry.invoke("dir_list", args)
-                    except Exception as e:
-                        out = {"error": str(e)}
-
-                # PRZESZUKIWANIE PLIKÓW
-                elif name == "file_search":
-                    try:
-                        out = registry.invoke("file_search", args)
-                    except Exception as e:
-                        out = {"error": str(e)}
-
-                # CZYTANIE FRAGMENTÓW PLIKÓW
-                elif name == "file_chunk":
-                    try:
-                        out = registry.invoke("file_chunk", args)
-                    except Exception as e:
-                        out = {"error": str(e)}
-
-                # ZAPIS DO PLIKU
-                elif name == "file_write":
-                    try:
-                        out = registry.invoke("file_write", args)
-                    except Exception as e:
-                        out = {"error": str(e)}
-
-                # nieznane narzędzie
+            })
+
+            # wykonanie narzędzi w kolejności modelu: file_write to bariera,
+            # tylko ciągi sąsiednich odczytów/sieci między zapisami idą równolegle
+            outs: List[Any] = [None] * len(ids)
+            run: List[int] = []
+
+            def _flush_run() -> None:
+                if len(run) > 1:
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(run))) as ex:
+                        done = ex.map(self._run_tool, [names[k] for k in run], [args[k] for k in run])
+                        for k, out_str in zip(run, done):
+                            outs[k] = out_str
                 else:
-                    out = {"error": f"Unknown tool {name}"}
-
-                # wymuszenie tekstu
-                if isinstance(out, (dict, list)):
-                    out_str = json.dumps(out, ensure_ascii=False)
+                    for k in run:
+                        outs[k] = self._run_tool(names[k], args[k])
+                run.clear()
+
+            for k, n in enumerate(names):
+                if n == "file_write":
+                    _flush_run()
+                    outs[k] = self._run_tool(n, args[k])
                 else:
-                    out_str = str(out)
-
-                final_messages.append({
-                    "role": "tool",
-                    "tool_call_id": call.id,
-                    "content": out_str,
-                })
+                    run.append(k)
+            _flush_run()
+
+            # Wszystkie narzędzia zwróciły błąd → drugie wywołanie LLM niczego nie wniesie
+            errors = [self._tool_error(o) for o in outs]
+            if all(errors):
+                self.logger.log("llm.tools.all_failed", tools=",".join(names))
+                msg = "❌ Narzędzia zwróciły błędy:\n" + "\n".join(f"- {n}: {e}" for n, e in zip(names, errors))
+                if stream:
+                    print(msg, end="")
+                return msg
+
+            # Bezpośredni odczyt (read/cat/ls) jednym narzędziem → zwracamy wynik bez LLM
+            if (len(ids) == 1 and names[0] in _DIRECT_READ_TOOLS and isinstance(outs[0], dict)
+                    and prompt.lstrip().lower().startswith(("read ", "cat ", "ls "))):
+                out = outs[0]
+                if names[0] == "dir_list":
+                    direct = "\n".join(
+                        f"{it['name']}/" if it.get("type") == "dir" else it["name"] for it in out.get("items", [])
+                    )
+                else:
+                    direct = out.get("content", "")
+                self.logger.log("llm.tools.direct", tool=names[0])
+                if stream:
+                    print(direct, end="")
+                return direct
+
+            final_messages.extend(
+                {"role": "tool", "tool_call_id": i, "content": self._tool_text(o)} for i, o in zip(ids, outs)
+            )
 
-            resp2 = self.client.chat.completions.create(
+            if stream and answer:
+                print()
+            answer2, _, _ = self._stream_chat(
+                echo=stream,
                 model=self.cfg.OPENAI_MODEL,
                 temperature=self.cfg.OPENAI_TEMPERATURE,
                 max_tokens=self.cfg.OPENAI_MAX_TOKENS,
                 messages=final_messages,
             )
-
-            return resp2.choices[0].message.content.strip()
+            return answer2
 
         # --- Log: odpowiedź ---
         self.logger.log(
@@ -1804,17 +2443,23 @@ class GPTChatAPI:
             answer_len=len(answer)
         )
 
-        # --- Tokeny ---
-        try:
-            u = resp.usage
-            self.meter.add_usage(
-                model=self.cfg.OPENAI_MODEL,
-                prompt_tokens=int(getattr(u, "prompt_tokens", 0)),
-                completion_tokens=int(getattr(u, "completion_tokens", 0)),
-                note=note or ("execute" if execute else "noexec"),
-            )
-        except Exception:
-            pass
+        # --- Tokeny + zapis do cache (tylko świeże odpowiedzi) ---
+        if fresh:
+            try:
+                u = usage
+                self.meter.add_usage(
+                    model=self.cfg.OPENAI_MODEL,
+                    prompt_tokens=int(getattr(u, "prompt_tokens", 0)),
+                    completion_tokens=int(getattr(u, "completion_tokens", 0)),
+                    note=note or ("execute" if execute else "noexec"),
+                )
+            except Exception:
+                pass
+            if cache_key and answer:
+                self.resp_cache.put(cache_key, answer)
+            # odpowiedzi z komendą do wykonania nie trafiają do cache semantycznego
+            if sem_vec is not None and answer and not _is_command_answer(answer):
+                self.sem_cache.add(sem_vec, prompt, answer, sem_ctx)
 
         # --- Historia ---
         self.memory.add_message(self.session_id, "user", prompt)
@@ -1835,11 +2480,7 @@ class GPTChatAPI:
                 return out
 
             # Format 2: ```bash ...```
-            m = re.search(
-                r"```(?:bash|sh)?\s*([\s\S]*?)```",
-                answer,
-                re.IGNORECASE
-            )
+            m = _BASH_FENCE_RE.search(answer)
             if m:
                 cmd = m.group(1).strip()
                 ok, warn = self.validator.validate(cmd)
@@ -1850,11 +2491,76 @@ class GPTChatAPI:
 
         return answer
 
+    # --------- Batch API (zadania offline, 24h, połowa ceny) ---------
+    def submit_batch(self, prompts: List[str], note: str = "batch") -> str:
+        """Wysyła prompty jako jeden batch /v1/chat/completions; zwraca id batcha."""
+        ts = time.strftime("%Y%m%d_%H%M%S")
+        req_path = self.projects.current_path() / f"batch_{ts}.jsonl"
+        system = {"role": "system", "content": self._static_system_prompt()}
+        with open(req_path, "w", encoding="utf-8") as f:
+            for i, pr in enumerate(prompts):
+                f.write(json.dumps({
+                    "custom_id": f"req-{i}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": self.cfg.OPENAI_MODEL,
+                        "temperature": self.cfg.OPENAI_TEMPERATURE,
+                        "max_tokens": self.cfg.OPENAI_MAX_TOKENS,
+                        "messages": [system, {"role": "user", "content": pr}],
+                    },
+                }, ensure_ascii=False) + "\n")
+        with open(req_path, "rb") as f:
+            up = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=up.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"note": note},
+        )
+        self.logger.log("batch.submit", id=batch.id, count=len(prompts), file=str(req_path))
+        return batch.id
+
+    def batch_status(self, batch_id: str) -> str:
+        b = self.client.batches.retrieve(batch_id)
+        rc = getattr(b, "request_counts", None)
+        done = f" {getattr(rc, 'completed', 0)}/{getattr(rc, 'total', 0)}" if rc else ""
+        return f"{b.id}: {b.status}{done}"
+
+    def batch_fetch(self, batch_id: str) -> str:
+        """Pobiera wyniki zakończonego batcha do projektu i nalicza tokeny."""
+        b = self.client.batches.retrieve(batch_id)
+        if b.status != "completed" or not b.output_file_id:
+            return f"⏳ Batch {batch_id}: {b.status}"
+        raw = self.client.files.content(b.output_file_id).text
+        out_path = self.projects.current_path() / f"batch_{batch_id}_out.jsonl"
+        _atomic_write_text(out_path, raw)
+        n = 0
+        for line in raw.splitlines():
+            if not line.strip():
+                continue
+            body = (json.loads(line).get("response") or {}).get("body") or {}
+            u = body.get("usage") or {}
+            self.meter.add_usage(
+                model=self.cfg.OPENAI_MODEL,
+                prompt_tokens=int(u.get("prompt_tokens", 0)),
+                completion_tokens=int(u.get("completion_tokens", 0)),
+                note="batch",
+                price_factor=0.5,   # Batch API: połowa ceny
+            )
+            n += 1
+        self.logger.log("batch.fetch", id=batch_id, results=n, path=str(out_path))
+        return f"✅ {n} wyników zapisano do {out_path}"
+
     def device_command(self, text: str) -> str | None:
         """
         Rozpoznaje i wykonuje polecenie sprzętowe przez HardwareBridge.
         Zwraca wynik tekstowy lub None, jeśli nie rozpoznano.
         """
+        # filtr na poziomie modułu: mostek powstaje dopiero przy pierwszej linii wyglądającej na komendę sprzętową
+        from modules.hardware_bridge import might_handle
+        if not might_handle(text):
+            return None
         try:
             result = bridge.execute(text)
             if result:
@@ -1864,6 +2570,65 @@ class GPTChatAPI:
             print(f"[hardware_bridge error] {e}")
             return None
 
+    @functools.cached_property
+    def _git_bg(self) -> concurrent.futures.ThreadPoolExecutor:
+        # jeden wątek = commity po kolei, bez walki o index.lock
+        return concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="git-bg")
+
+    def _persist_codegen(self, abs_target: Path, filename: str, rec: Optional[Dict]) -> None:
+        """Commity po codegen: repo HALbridge (rejestr) i repo projektu."""
+        if rec is not None:
+            try:
+                code_registry.git_autocommit(
+                    os.path.relpath(abs_target, Path.home() / "HALbridge"),
+                    f"auto: code generated {rec['project']}"
+                )
+            except Exception as e:
+                self.logger.log("code.registry.git_error", error=str(e))
+        try:
+            self.git.autocommit(f"codegen: {filename}")
+        except Exception:
+            pass
+
+    def _speculative_codegen(self, prompt: str) -> str:
+        """
+        Jedno wywołanie z n=CODEGEN_CANDIDATES; zwraca pierwszego kandydata,
+        który się kompiluje i nie ma brakujących importów (albo pierwszego).
+        """
+        msgs = self._messages_for(prompt)
+        self.logger.log("llm.request", model=self.cfg.OPENAI_MODEL, note="code_gen", prompt_len=len(prompt),
+                        n=self.cfg.CODEGEN_CANDIDATES)
+        resp = self.client.chat.completions.create(
+            model=self.cfg.OPENAI_MODEL,
+            temperature=self.cfg.OPENAI_TEMPERATURE,
+            max_tokens=self.cfg.OPENAI_MAX_TOKENS,
+            messages=msgs,
+            n=self.cfg.CODEGEN_CANDIDATES,
+        )
+        try:
+            u = resp.usage
+            self.meter.add_usage(
+                model=self.cfg.OPENAI_MODEL,
+                prompt_tokens=int(getattr(u, "prompt_tokens", 0)),
+                completion_tokens=int(getattr(u, "completion_tokens", 0)),
+                note="code_gen_spec",
+            )
+        except Exception:
+            pass
+
+        candidates = [(c.message.content or "").strip() for c in resp.choices]
+        answer = candidates[0] if candidates else ""
+        for idx, cand in enumerate(candidates):
+            err, missing = analyze_code(sanitize_llm_code(cand))
+            if not err and not missing:
+                answer = cand
+                self.logger.log("code.gen.speculative", picked=idx, of=len(candidates))
+                break
+
+        self.memory.add_message(self.session_id, "user", prompt)
+        self.memory.add_message(self.session_id, "assistant", answer)
+        return answer
+
     # --------- CODE: generuj → napraw → zapisz → auto-commit → uruchom ---------
     def generate_and_run_code(self, prompt: str, filename: Optional[str] = None) -> str:
         # --- FAZA 2: analiza promptu ---
@@ -1896,21 +2661,22 @@ class GPTChatAPI:
                 expected_output = None
 
         self.logger.log("code.gen.start", prompt_len=len(prompt))
-        raw = self.ask_ai(prompt, execute=False, note="code_gen")
+        if self.cfg.SPECULATIVE_CODEGEN and self.client:
+            raw = self._speculative_codegen(prompt)
+        else:
+            raw = self.ask_ai(prompt, execute=False, note="code_gen")
         code = sanitize_llm_code(raw)
 
         # Preflight i auto-naprawa
         attempts = 0
         max_attempts = 2
-        err = compile_check(code)
-        missing = missing_third_party(code)
+        err, missing = analyze_code(code)
         while (err or missing) and attempts < max_attempts:
             attempts += 1
             self.logger.log("code.gen.fix_attempt", attempt=attempts, err=bool(err), missing=",".join(missing))
             fix_raw = self.ask_ai(repair_prompt(code, err or "", missing), execute=False, note="code_fix")
             code = sanitize_llm_code(fix_raw)
-            err = compile_check(code)
-            missing = missing_third_party(code)
+            err, missing = analyze_code(code)
 
         # Nazwa pliku
         if not filename:
@@ -1922,36 +2688,31 @@ class GPTChatAPI:
             self.logger.log("code.save.error", filename=filename)
             return f"❌ Nie udało się zapisać pliku (sandbox): {filename}"
         abs_target = self.projects.current_path() / filename
+        data = code.encode("utf-8")
         print(f"💾 Zapisano kod do {abs_target}")
-        self.logger.log("code.save.ok", path=str(abs_target), bytes=len(code.encode('utf-8')))
+        self.logger.log("code.save.ok", path=str(abs_target), bytes=len(data))
 
-        # --- FAZA 3b: rejestracja wygenerowanego kodu ---
-        if 'code_registry' in globals() and code_registry and abs_target and os.path.exists(abs_target):
+        # --- FAZA 3b: rejestracja wygenerowanego kodu (SHA z pamięci, bez ponownego odczytu) ---
+        rec = None
+        if 'code_registry' in globals() and code_registry:
             try:
                 rec = code_registry.register_path(
                     abs_target,
                     project=(getattr(self, "active_project", None) or "sandbox"),
-                    meta=getattr(self, "_last_task_meta", None)
+                    meta=getattr(self, "_last_task_meta", None),
+                    precomputed_sha=hashlib.sha256(data).hexdigest(),
                 )
                 print(f"[REGISTRY] Zarejestrowano plik: {rec['file']} (SHA256={rec['sha256'][:8]})")
-                code_registry.git_autocommit(
-                    os.path.relpath(abs_target, Path.home() / "HALbridge"),
-                    f"auto: code generated {rec['project']}"
-                )
             except Exception as e:
                 print(f"[REGISTRY] Błąd rejestracji: {e}")
 
-        # Auto-commit po zapisie
-        try:
-            self.git.autocommit(f"codegen: {filename}")
-        except Exception:
-            pass
+        # Auto-commity w tle — uruchomienie kodu nie czeka na git
+        persisted = self._git_bg.submit(self._persist_codegen, abs_target, filename, rec)
 
-        # Sprawdzenie składni
-        syn = compile_check(code)
-        if syn:
-            self.logger.log("code.compile.error", err=syn)
-            return f"❌ Błąd komp.: {syn}"
+        # Sprawdzenie składni (wynik z ostatniego analyze_code — kod się nie zmienił)
+        if err:
+            self.logger.log("code.compile.error", err=err)
+            return f"❌ Błąd komp.: {err}"
 
         # Uruchom wg rozszerzenia
         low = str(abs_target).lower()
@@ -1974,11 +2735,15 @@ class GPTChatAPI:
         success, out = self.exec.run(run_cmd)
 
         # Jedna próba auto-fix po runtime errorze
-        if not success and ("Traceback (most recent call last):" in out or "ModuleNotFoundError" in out or "ImportError" in out):
+        if not success and ("Traceback (most recent call last):" in out or "ModuleNotFoundError" in out
+                            or "ImportError" in out or "SyntaxError" in out):
             self.logger.log("code.runtime.error", cmd=run_cmd)
-            fix_raw = self.ask_ai(repair_prompt(code, out, missing_third_party(code)), execute=False, note="code_runtime_fix")
+            fix_raw = self.ask_ai(repair_prompt(code, out, missing), execute=False, note="code_runtime_fix")
             code2 = sanitize_llm_code(fix_raw)
             if code2 and code2 != code:
+                # commit oryginału musi się skończyć przed nadpisaniem pliku — inaczej `git add`
+                # mógłby złapać poprawkę, niezgodną z SHA zapisanym w rejestrze
+                persisted.result()
                 if not self.files.write(filename, code2):
                     self.logger.log("code.runtime.save_error", filename=filename)
                     return f"❌ Nie udało się zapisać poprawki (sandbox): {filename}"
@@ -1992,6 +2757,453 @@ class GPTChatAPI:
         return out
 
 
+# =================== CLI: komendy dokładne ===================
+# Handler: (api, cfg, rest) → None; rest to reszta linii (tu zawsze pusta).
+
+def _cmd_help(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    print(show_help())
+
+
+def _cmd_about(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    print(f"🤖 Agent {APP_VERSION} | Model: {cfg.OPENAI_MODEL} | T={cfg.OPENAI_TEMPERATURE} | MAXTOK={cfg.OPENAI_MAX_TOKENS}")
+
+
+def _cmd_strict_on(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    cfg.STRICT_MODE = True
+    print("✅ STRICT: ON")
+
+
+def _cmd_strict_off(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    cfg.STRICT_MODE = False
+    print("✅ STRICT: OFF")
+
+
+def _cmd_mem_clear(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    cnt = api.memory.clear_memories(api.session_id)
+    print(f"🗑️ Usunięto {cnt} wpisów pamięci")
+
+
+def _cmd_logs_clear(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    print(api.logger.clear())
+
+
+def _cmd_diag(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    api.logger.log(
+        "diag.run",
+        project=api.projects.current_name(),
+        model=cfg.OPENAI_MODEL,
+        strict=cfg.STRICT_MODE,
+        net=cfg.ENABLE_NETWORK_OPS,
+    )
+    print(render_diag(cfg, api))
+
+
+def _cmd_tokens(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    print(api.meter.summary())
+
+
+def _cmd_tokens_report(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    print(api.meter.report())
+
+
+def _cmd_tokens_reset(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    api.meter.reset()
+    print("✅ Liczniki tokenów wyzerowane.")
+
+
+def _cmd_vcs_init(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    print(api.git.init())
+
+
+def _cmd_vcs_status(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    print(api.git.status())
+
+
+def _cmd_modules_list(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    mods = api.modules.list()
+    if mods:
+        print("Dostępne moduły:")
+        for m in mods:
+            print(f"- {m}")
+    else:
+        print("(brak modułów)")
+
+
+def _cmd_net_on(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    cfg.ENABLE_NETWORK_OPS = True
+    print("🌐 Sieć: ON")
+
+
+def _cmd_net_off(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    cfg.ENABLE_NETWORK_OPS = False
+    print("🌐 Sieć: OFF")
+
+
+def _cmd_net_list(api: "GPTChatAPI", cfg: Config, rest: str) -> None:
+    wl = sorted(cfg.NET_ALLOWED) or ["(pusto)"]
+    print("Dozwolone domeny:")
+    print("\n".join(f"- {d}" for d in wl))
+    print(f"Status: {'ON' if cfg.ENABLE_NETWORK_OPS else 'OFF'} | timeout={cfg.NET_TIMEOUT}s | max={cfg.NET_MAX_BYTES}B")
+
+
+_EXACT_COMMANDS = {
+    "help": _cmd_help,
+    "?": _cmd_help,
+    "about": _cmd_about,
+    "strict on": _cmd_strict_on,
+    "strict off": _cmd_strict_off,
+    "mem clear": _cmd_mem_clear,
+    "logs clear": _cmd_logs_clear,
+    "diag": _cmd_diag,
+    "tokens": _cmd_tokens,
+    "tokens report": _cmd_tokens_report,
+    "tokens reset": _cmd_tokens_reset,
+    "vcs init": _cmd_vcs_init,
+    "vcs ensure": _cmd_vcs_init,
+    "vcs status": _cmd_vcs_status,
+    "modules list": _cmd_modules_list,
+    "net on": _cmd_net_on,
+    "net off": _cmd_net_off,
+    "net list": _cmd_net_list,
+}
+
+# Sterowanie YouTube w BrowserBridge (dopasowanie po małych literach)
+_YT_COMMANDS = {
+    **dict.fromkeys(("yt play", "yt pause", "yt pp"), lambda api, cfg, rest: print(browser.yt_play_pause())),
+    **dict.fromkeys(("yt next", "yt n"), lambda api, cfg, rest: print(browser.yt_next())),
+    **dict.fromkeys(("yt prev", "yt p"), lambda api, cfg, rest: print(browser.yt_prev())),
+    **dict.fromkeys(("yt vol+", "yt up"), lambda api, cfg, rest: print(browser.yt_volume_up())),
+    **dict.fromkeys(("yt vol-", "yt down"), lambda api, cfg, rest: print(browser.yt_volume_down())),
+    "yt mute": lambda api, cfg, rest: print(browser.yt_mute()),
+    **dict.fromkeys(("yt fs", "yt fullscreen"), lambda api, cfg, rest: print(browser.yt_fullscreen())),
+}
+
+
+# =================== CLI: komendy z argumentami ===================
+# _COMMANDS: pierwsze słowo linii → handler(api, cfg, rest) -> bool.
+# False = składnia nie pasuje do komendy; linia idzie dalej (natural query / STRICT / LLM).
+
+def _parse_head(text: str, n: int) -> Tuple[List[str], str]:
+    """Pierwsze n tokenów (shlex, posix) + reszta linii w oryginale, z cudzysłowami."""
+    lex = shlex.shlex(text, posix=True)
+    lex.whitespace_split = True
+    lex.commenters = ""  # jak shlex.split: "#" to zwykły znak (fragmenty URL, argumenty)
+    head: List[str] = []
+    for _ in range(n):
+        tok = lex.get_token()
+        if tok is None:
+            break
+        head.append(tok)
+    return head, text[lex.instream.tell():].strip() if len(head) == n else ""
+
+
+def _print_memories(rows: List[Dict], empty: str) -> None:
+    if not rows:
+        print(empty)
+        return
+    for r in rows:
+        pin = "📌" if r["pinned"] else "  "
+        print(f"{pin} #{r['id']} [{r['kind']}] {r['created_at']}\n  {r['content']}")
+
+
+def _cmd_model(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    cfg.OPENAI_MODEL = rest
+    print(f"✅ Ustawiono model: {rest}")
+    return True
+
+
+def _cmd_temp(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    try:
+        t = float(rest)
+        if not (0.0 <= t <= 1.0):
+            raise ValueError()
+        cfg.OPENAI_TEMPERATURE = t
+        print(f"✅ Ustawiono temperaturę: {t}")
+    except Exception:
+        print("❌ Podaj liczbę 0.0–1.0, np. temp 0.2")
+    return True
+
+
+def _cmd_max_tokens(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    try:
+        mt = int(rest)
+        if mt <= 0:
+            raise ValueError()
+        cfg.OPENAI_MAX_TOKENS = mt
+        print(f"✅ Ustawiono max_tokens: {mt}")
+    except Exception:
+        print("❌ Podaj dodatnią liczbę całkowitą, np. max_tokens 1200")
+    return True
+
+
+def _cmd_project(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    sub, _, arg = rest.partition(" ")
+    arg = arg.strip()
+    if sub == "list" and not arg:
+        cur = api.projects.current_name()
+        for name in api.projects.list():
+            print(f"{'*' if name == cur else ' '} {name}")
+    elif sub == "pwd" and not arg:
+        print(api.projects.current_path().resolve())
+    elif sub == "new" and arg:
+        print(f"✅ Utworzono i otwarto projekt: {api.projects.new(arg)}")
+    elif sub == "open" and arg:
+        print(f"✅ Otwarto projekt: {arg}" if api.projects.open(arg) else f"❌ Brak projektu: {arg}")
+    else:
+        return False
+    return True
+
+
+def _cmd_read(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    txt = api.files.read(rest)
+    print(txt if txt is not None else "❌ Nie udało się odczytać (sandbox)")
+    return True
+
+
+def _cmd_write(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    parts = shlex.split(rest)
+    if len(parts) >= 2:
+        ok = api.files.write(parts[0], " ".join(parts[1:]))
+        print("✅ Zapisano" if ok else "❌ Błąd zapisu (sandbox)")
+    else:
+        print("❌ Składnia: write <plik> <treść>")
+    return True
+
+
+def _cmd_mem(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    sub, _, arg = rest.partition(" ")
+    arg = arg.strip()
+    if sub == "add" and arg:
+        mid = api.memory.add_memory(api.session_id, arg, kind="note", pinned=False)
+        print(f"✅ Dodano pamięć #{mid}")
+    elif sub in ("pin", "unpin") and arg:
+        pin = sub == "pin"
+        try:
+            mid = int(arg)
+            api.memory.pin_memory(mid, pin)
+            print(f"✅ {'Przypięto' if pin else 'Odpięto'} pamięć #{mid}")
+        except Exception:
+            print(f"❌ Składnia: mem {sub} <id>")
+    elif sub == "search" and arg:
+        _print_memories(api.memory.search_memories(api.session_id, arg, limit=20), "(brak wyników)")
+    elif sub == "list":
+        n = int(arg) if arg.isdigit() else 20
+        _print_memories(api.memory.list_memories(api.session_id, limit=n), "(pusto)")
+    else:
+        return False
+    return True
+
+
+def _cmd_logs(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    sub, _, arg = rest.partition(" ")
+    arg = arg.strip()
+    if sub == "tail":
+        print(api.logger.tail(int(arg) if arg.isdigit() else 100))
+    elif sub == "grep" and arg:
+        if not Path(cfg.APP_LOG_FILE).exists():
+            print("(brak logów)")
+            return True
+        cnt = 0
+        for L in api.logger.grep(arg):
+            print(L)
+            cnt += 1
+        if cnt == 0:
+            print("(brak trafień)")
+    elif sub == "export" and arg:
+        print(api.logger.export(arg))
+    else:
+        return False
+    return True
+
+
+def _cmd_vcs(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    sub, _, arg = rest.partition(" ")
+    arg = arg.strip()
+    if sub == "oneline":
+        parts = shlex.split(arg)
+        print(api.git.log(int(parts[0]) if parts and parts[0].isdigit() else 20))
+    elif sub == "diff":
+        parts = shlex.split(arg)
+        print(api.git.diff(parts[0] if parts else None))
+    elif rest.startswith("save:"):
+        msg = rest.split(":", 1)[1].strip()
+        if not msg:
+            print('❌ Podaj komunikat, np. vcs save: "komentarz"')
+        else:
+            print(api.git.commit(msg))
+    elif sub == "commit" and arg:
+        msg = arg.strip('"').strip("'")
+        if not msg:
+            print('❌ Podaj komunikat: vcs commit "wiadomość"')
+        else:
+            print(api.git.commit(msg))
+    else:
+        return False
+    return True
+
+
+def _cmd_module(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    sub, _, arg = rest.partition(" ")
+    arg = arg.strip()
+    if sub not in ("info", "run") or not arg:
+        return False
+    head, args = _parse_head(arg, 1)
+    if not head:
+        print(f"❌ Składnia: module {sub} <nazwa>")
+    elif sub == "info":
+        print(api.modules.info(head[0]))
+    else:
+        # args w oryginalnej postaci — ModuleRunner sam robi shlex.split
+        ok, out = api.modules.run(head[0], args)
+        print(out)
+    return True
+
+
+def _cmd_net(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    sub, _, arg = rest.partition(" ")
+    dom = arg.strip().lower()
+    if sub == "allow" and arg:
+        if dom:
+            api.http.allow(dom)
+            print(f"✅ Dodano do whitelist: {dom}")
+        else:
+            print("❌ Podaj domenę")
+    elif sub == "deny" and arg:
+        if dom and api.http.deny(dom):
+            print(f"✅ Usunięto z whitelist: {dom}")
+        else:
+            print("❌ Domena nie jest na whitelist")
+    else:
+        return False
+    return True
+
+
+def _cmd_geth(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    head, _ = _parse_head(rest, 1)
+    if head:
+        print(api.http.get(head[0], want_headers=True))
+    else:
+        print("❌ Składnia: geth <URL>")
+    return True
+
+
+def _cmd_get(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    head, tail = _parse_head(rest, 1)
+    if head:
+        print(api.http.get(head[0], want_headers=("--headers" in tail.split())))
+    else:
+        print("❌ Składnia: get <URL> [--headers]")
+    return True
+
+
+def _cmd_web(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    print(registry.invoke("web_fetch", {"url": rest}))
+    return True
+
+
+def _cmd_batch(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    parts = shlex.split(rest)
+    if not api.client:
+        print("🔌 [Offline] Brak OPENAI_API_KEY.")
+    elif len(parts) == 2 and parts[0] == "submit":
+        src = Path(parts[1]).expanduser()
+        try:
+            prompts = [L.strip() for L in src.read_text(encoding="utf-8").splitlines() if L.strip()]
+        except OSError as e:
+            print(f"❌ Nie można odczytać {src}: {e}")
+            return True
+        if not prompts:
+            print("❌ Plik nie zawiera promptów")
+            return True
+        print(f"📦 Batch: {api.submit_batch(prompts)} ({len(prompts)} promptów)")
+    elif len(parts) == 2 and parts[0] == "status":
+        print(api.batch_status(parts[1]))
+    elif len(parts) == 2 and parts[0] == "fetch":
+        print(api.batch_fetch(parts[1]))
+    else:
+        print("❌ Składnia: batch submit <plik> | batch status <id> | batch fetch <id>")
+    return True
+
+
+def _cmd_ai(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    api.ask_ai(rest, execute=False, note="ai", stream=True)
+    print()
+    print(api.meter.summary())
+    return True
+
+
+# "code plik.py: prompt" / "code plik.py prompt"
+_CODE_FILE_RE = re.compile(r'^([A-Za-z0-9_\-./]+?\.(?:py|sh|bash))\s*:\s*(.*)$')
+_CODE_FN_RE = re.compile(r'^[A-Za-z0-9_\-./]+?\.(?:py|sh|bash)$')
+
+
+def _cmd_code(api: "GPTChatAPI", cfg: Config, rest: str) -> bool:
+    if not rest:
+        return False
+    filename = None
+    m = _CODE_FILE_RE.match(rest)
+    if m:
+        filename, pr = m.group(1), m.group(2).strip()
+    else:
+        parts = rest.split(maxsplit=1)
+        if len(parts) == 2 and _CODE_FN_RE.match(parts[0]):
+            filename, pr = parts[0], parts[1].strip()
+        else:
+            pr = rest
+    print(api.generate_and_run_code(pr, filename=filename))
+    print(api.meter.summary())
+    return True
+
+
+_COMMANDS = {
+    "model": _cmd_model,
+    "temp": _cmd_temp,
+    "max_tokens": _cmd_max_tokens,
+    "project": _cmd_project,
+    "read": _cmd_read,
+    "write": _cmd_write,
+    "mem": _cmd_mem,
+    "logs": _cmd_logs,
+    "vcs": _cmd_vcs,
+    "module": _cmd_module,
+    "net": _cmd_net,
+    "geth": _cmd_geth,
+    "get": _cmd_get,
+    "web": _cmd_web,
+    "batch": _cmd_batch,
+    "ai": _cmd_ai,
+    "code": _cmd_code,
+}
+
+# Heurystyka „otwórz/pokaż/znajdź/wyszukaj”: strona WWW czy operacja na plikach?
+# Dopasowanie podciągów (jak wcześniej `word in low`), więc „plikach”, „katalogi” też łapią.
+_BROWSER_VERBS = ("otwórz", "pokaż", "znajdź", "wyszukaj")
+_FS_WORDS_RE = re.compile(r"folder|katalog|plik|[/\\~]")
+# Wyzwalacze resolve_natural_query (web_fetch) — bez trafienia funkcja zwraca None
+_NATURAL_QUERY_RE = re.compile(r"^otw[óo]rz |stron[ęe]|szukaj", re.IGNORECASE)
+_URL_RE = re.compile(r"https?://|www\.|stron[ęe]|strona |\.[a-z]{2,4}(?:/|$|\s)")
+
+
 # =================== CLI MAIN ===================
 def banner(cfg: Config, api: GPTChatAPI):
     print("🌐 GPT TERMINAL v3 — 'exit' aby zakończyć")
@@ -2108,68 +3320,23 @@ def main():
                 continue
 
             # Wyjście
-            if line.lower() in ("exit", "quit", "q"):
+            if low in ("exit", "quit", "q"):
                 print("👋 Do zobaczenia.")
                 break
 
-            # Pomoc / meta
-            if line in ("help", "?"):
-                print(show_help())
-                continue
-
-            if line == "about":
-                print(f"🤖 Agent {APP_VERSION} | Model: {cfg.OPENAI_MODEL} | T={cfg.OPENAI_TEMPERATURE} | MAXTOK={cfg.OPENAI_MAX_TOKENS}")
+            # Komendy dokładne (help, strict, tokens, net on/off, yt ...) — jedno wyszukanie w dict
+            handler = _EXACT_COMMANDS.get(line) or _YT_COMMANDS.get(low)
+            if handler:
+                handler(api, cfg, "")
                 continue
 
-            # STRICT on/off
-            if line == "strict on":
-                cfg.STRICT_MODE = True
-                print("✅ STRICT: ON")
+            # Komendy z argumentami (model, mem, vcs, get, ai, code ...) — wybór po pierwszym słowie
+            verb, _, rest = line.partition(" ")
+            handler = _COMMANDS.get(verb)
+            if handler and handler(api, cfg, rest.strip()):
                 continue
 
-            if line == "strict off":
-                cfg.STRICT_MODE = False
-                print("✅ STRICT: OFF")
-                continue
-
-            # Zmiana modelu/temperatury/max_tokens
-            if line.startswith("model "):
-                name = line.split(" ", 1)[1].strip()
-                if not name:
-                    print("❌ Podaj nazwę modelu, np. model gpt-4o-mini")
-                    continue
-                cfg.OPENAI_MODEL = name
-                print(f"✅ Ustawiono model: {name}")
-                continue
-
-            if line.startswith("temp "):
-                try:
-                    t = float(line.split(" ", 1)[1].strip())
-                    if not (0.0 <= t <= 1.0):
-                        raise ValueError()
-                    cfg.OPENAI_TEMPERATURE = t
-                    print(f"✅ Ustawiono temperaturę: {t}")
-                except Exception:
-                    print("❌ Podaj liczbę 0.0–1.0, np. temp 0.2")
-                continue
-
-            if line.startswith("max_tokens "):
-                try:
-                    mt = int(line.split(" ", 1)[1].strip())
-                    if mt <= 0:
-                        raise ValueError()
-                    cfg.OPENAI_MAX_TOKENS = mt
-                    print(f"✅ Ustawiono max_tokens: {mt}")
-                except Exception:
-                    print("❌ Podaj dodatnią liczbę całkowitą, np. max_tokens 1200")
-                continue
-
-            # Projekty
-            if line == "project list":
-                    break
-
             # --- GRAFICZNA PRZEGLĄDARKA (BrowserBridge) ---
-            low = line.lower().strip()
             if low.startswith(("otwórz ", "otworz ", "pokaż stronę", "pokaz strone", "otwórz stronę", "open ")):
                 if browser:
                     print(browser.open(line))
@@ -2177,342 +3344,17 @@ def main():
                     print("❌ BrowserBridge nie jest dostępny")
                 continue
 
-            # Files
-            if line.startswith("read "):
-                path = line[5:].strip()
-                txt = api.files.read(path)
-                print(txt if txt is not None else "❌ Nie udało się odczytać (sandbox)")
-                continue
-
-            if line.startswith("write "):
-                parts = shlex.split(line)
-                if len(parts) >= 3:
-                    path = parts[1]
-                    content = " ".join(parts[2:])
-                    ok = api.files.write(path, content)
-                    print("✅ Zapisano" if ok else "❌ Błąd zapisu (sandbox)")
-                else:
-                    print("❌ Składnia: write <plik> <treść>")
-                continue
-
-            # Memories
-            if line.startswith("mem add "):
-                txt = line[len("mem add "):].strip()
-                mid = api.memory.add_memory(api.session_id, txt, kind="note", pinned=False)
-                print(f"✅ Dodano pamięć #{mid}")
-                continue
-
-            if line.startswith("mem pin "):
-                try:
-                    mid = int(line[len("mem pin "):].strip())
-                    api.memory.pin_memory(mid, True)
-                    print(f"✅ Przypięto pamięć #{mid}")
-                except Exception:
-                    print("❌ Składnia: mem pin <id>")
-                continue
-
-            if line.startswith("mem unpin "):
-                try:
-                    mid = int(line[len("mem unpin "):].strip())
-                    api.memory.pin_memory(mid, False)
-                    print(f"✅ Odpięto pamięć #{mid}")
-                except Exception:
-                    print("❌ Składnia: mem unpin <id>")
-                continue
-
-            if line.startswith("mem search "):
-                q = line[len("mem search "):].strip()
-                rows = api.memory.search_memories(api.session_id, q, limit=20)
-                if not rows:
-                    print("(brak wyników)")
-                else:
-                    for r in rows:
-                        pin = "📌" if r["pinned"] else "  "
-                        print(f"{pin} #{r['id']} [{r['kind']}] {r['created_at']}\n  {r['content']}")
-                continue
-
-            if line.startswith("mem list"):
-                parts = shlex.split(line)
-                n = 20
-                if len(parts) == 3 and parts[2].isdigit():
-                    n = int(parts[2])
-                rows = api.memory.list_memories(api.session_id, limit=n)
-                if not rows:
-                    print("(pusto)")
-                else:
-                    for r in rows:
-                        pin = "📌" if r["pinned"] else "  "
-                        print(f"{pin} #{r['id']} [{r['kind']}] {r['created_at']}\n  {r['content']}")
-                continue
-
-            if line == "mem clear":
-                cnt = api.memory.clear_memories(api.session_id)
-                print(f"🗑️ Usunięto {cnt} wpisów pamięci")
-                continue
-
-            # Logi
-            if line.startswith("logs tail"):
-                parts = shlex.split(line)
-                n = 100
-                if len(parts) == 3 and parts[2].isdigit():
-                    n = int(parts[2])
-                print(api.logger.tail(n))
-                continue
-
-            if line.startswith("logs grep "):
-                pattern = line[len("logs grep "):].strip()
-                path = Path(cfg.APP_LOG_FILE)
-                if not path.exists():
-                    print("(brak logów)")
-                else:
-                    pat = re.compile(pattern, re.IGNORECASE)
-                    cnt = 0
-                    with open(path, "r", encoding="utf-8", errors="replace") as f:
-                        for L in f:
-                            if pat.search(L):
-                                print(L.rstrip())
-                                cnt += 1
-                    if cnt == 0:
-                        print("(brak trafień)")
-                continue
-
-            if line.startswith("logs export "):
-                outp = line[len("logs export "):].strip()
-                srcp = Path(cfg.APP_LOG_FILE)
-                if not srcp.exists():
-                    print(" ❌ Brak logów do eksportu")
-                else:
-                    try:
-                        Path(outp).parent.mkdir(parents=True, exist_ok=True)
-                        shutil.copyfile(srcp, outp)
-                        print(f"✅ Wyeksportowano do {outp}")
-                    except Exception as e:
-                        print(f"❌ Błąd eksportu: {e}")
-                continue
-
-            if line == "logs clear":
-                try:
-                    Path(cfg.APP_LOG_FILE).unlink(missing_ok=True)
-                    for i in range(1, cfg.LOG_BACKUPS + 1):
-                        Path(f"{cfg.APP_LOG_FILE}.{i}").unlink(missing_ok=True)
-                    print("🧹 Logi wyczyszczone")
-                except Exception as e:
-                    print(f"❌ Błąd czyszczenia: {e}")
-                continue
-
-            # DIAG (krok 3)
-            if line == "diag":
-                api.logger.log(
-                    "diag.run",
-                    project=api.projects.current_name(),
-                    model=cfg.OPENAI_MODEL,
-                    strict=cfg.STRICT_MODE,
-                    net=cfg.ENABLE_NETWORK_OPS,
-                )
-                print(render_diag(cfg, api))
-                continue
-
-            # Tokeny / Meter (krok 4)
-            if line == "tokens":
-                print(api.meter.summary())
-                continue
-
-            if line == "tokens report":
-                print(api.meter.report())
-                continue
-
-            if line == "tokens reset":
-                api.meter.reset()
-                print("✅ Liczniki tokenów wyzerowane.")
-                continue
-
-            # VCS / Git (krok 5)
-            if line == "vcs init":
-                print(api.git.init())
-                continue
-
-            if line == "vcs ensure":
-                print(api.git.init())
-                continue
-
-            if line == "vcs status":
-                print(api.git.status())
-                continue
-
-            if line.startswith("vcs oneline"):
-                parts = shlex.split(line)
-                n = 20
-                if len(parts) >= 3 and parts[2].isdigit():
-                    n = int(parts[2])
-                print(api.git.log(n))
-                continue
-
-            if line.startswith("vcs diff"):
-                parts = shlex.split(line)
-                path_arg = parts[2] if len(parts) >= 3 else None
-                print(api.git.diff(path_arg))
-                continue
-
-            if line.startswith("vcs save:"):
-                msg = line.split(":", 1)[1].strip()
-                if not msg:
-                    print('❌ Podaj komunikat, np. vcs save: "komentarz"')
-                else:
-                    print(api.git.commit(msg))
-                continue
-
-            if line.startswith("vcs commit "):
-                msg = line[len("vcs commit "):].strip().strip('"').strip("'")
-                if not msg:
-                    print('❌ Podaj komunikat: vcs commit "wiadomość"')
-                else:
-                    print(api.git.commit(msg))
-                continue
-
-            # ===== Modules =====
-            if line == "modules list":
-                mods = api.modules.list()
-                if mods:
-                    print("Dostępne moduły:")
-                    for m in mods:
-                        print(f"- {m}")
-                else:
-                    print("(brak modułów)")
-                continue
-
-            if line.startswith("module info "):
-                parts = shlex.split(line)
-                if len(parts) >= 3:
-                    name = parts[2]
-                    print(api.modules.info(name))
-                else:
-                    print("❌ Składnia: module info <nazwa>")
-                continue
-
-            if line.startswith("module run "):
-                parts = shlex.split(line)
-                if len(parts) >= 3:
-                    name = parts[2]
-                    args = " ".join(parts[3:])
-                    ok, out = api.modules.run(name, args)
-                    print(out)
-                else:
-                    print("❌ Składnia: module run <nazwa> [args...]")
-                continue
-
-            # Sieć i GET
-            if line == "net on":
-                cfg.ENABLE_NETWORK_OPS = True
-                print("🌐 Sieć: ON")
-                continue
-
-            if line == "net off":
-                cfg.ENABLE_NETWORK_OPS = False
-                print("🌐 Sieć: OFF")
-                continue
-
-            if line.startswith("net allow "):
-                dom = line[len("net allow "):].strip().lower()
-                if dom:
-                    cfg.NET_ALLOWED.add(dom)
-                    print(f"✅ Dodano do whitelist: {dom}")
-                else:
-                    print("❌ Podaj domenę")
-                continue
-
-            if line.startswith("net deny "):
-                dom = line[len("net deny "):].strip().lower()
-                if dom and dom in cfg.NET_ALLOWED:
-                    cfg.NET_ALLOWED.remove(dom)
-                    print(f"✅ Usunięto z whitelist: {dom}")
-                else:
-                    print("❌ Domena nie jest na whitelist")
-                continue
-
-            if line == "net list":
-                wl = sorted(cfg.NET_ALLOWED) or ["(pusto)"]
-                print("Dozwolone domeny:")
-                print("\n".join(f"- {d}" for d in wl))
-                print(f"Status: {'ON' if cfg.ENABLE_NETWORK_OPS else 'OFF'} | timeout={cfg.NET_TIMEOUT}s | max={cfg.NET_MAX_BYTES}B")
-                continue
-
-            if line.startswith("geth "):
-                parts = shlex.split(line)
-                if len(parts) >= 2:
-                    url = parts[1]
-                    print(api.http.get(url, want_headers=True))
-                else:
-                    print("❌ Składnia: geth <URL>")
-                continue
-
-            if line.startswith("get "):
-                parts = shlex.split(line)
-                if len(parts) >= 2:
-                    url = parts[1]
-                    want_headers = ("--headers" in parts)
-                    print(api.http.get(url, want_headers=want_headers))
-                else:
-                    print("❌ Składnia: get <URL> [--headers]")
-                continue
-                continue
-            if low in ("yt play", "yt pause", "yt pp"):
-                print(browser.yt_play_pause())
-                continue
-            if low in ("yt next", "yt n"):
-                print(browser.yt_next())
-                continue
-            if low in ("yt prev", "yt p"):
-                print(browser.yt_prev())
-                continue
-            if low in ("yt vol+", "yt up"):
-                print(browser.yt_volume_up())
-                continue
-            if low in ("yt vol-", "yt down"):
-                print(browser.yt_volume_down())
-                continue
-            if low in ("yt mute",):
-                print(browser.yt_mute())
-                continue
-            if low in ("yt fs", "yt fullscreen"):
-                print(browser.yt_fullscreen())
-                continue
             # --- Natural web query (OPCJA B) ---
-            url = resolve_natural_query(line)
+            url = resolve_natural_query(line) if _NATURAL_QUERY_RE.search(line) else None
             if url:
                 result = registry.invoke("web_fetch", {"url": url})
                 print(result)
                 continue
 
-            # --- Explicit 'web <URL>' (OPCJA B) ---
-            if line.startswith("web "):
-                url = line[4:].strip()
-                result = registry.invoke("web_fetch", {"url": url})
-                print(result)
-                continue
             # --- Tryb przeglądarkowy (tylko dla rzeczywistych stron WWW) ---
-            if line.startswith(("otwórz", "pokaż", "znajdź", "wyszukaj")):
-                low = line.lower()
-
-                # heurystyka: czy to wygląda na operację na plikach / katalogach?
-                looks_like_fs = (
-                    any(word in low for word in ["folder", "katalog", "plik", "katalogu", "folderu", "pliku"])
-                    or any(ch in line for ch in ["/", "\\", "~"])
-                )
-
-                # heurystyka: czy to wygląda na URL / stronę WWW?
-                looks_like_url = (
-                    "http://" in low
-                    or "https://" in low
-                    or "www." in low
-                    or "stronę" in low
-                    or "strone" in low
-                    or "strona " in low
-                    # coś.tld / coś.tld/coś
-                    or bool(re.search(r"\.[a-z]{2,4}(/|$|\s)", low))
-                )
-
+            if line.startswith(_BROWSER_VERBS):
                 # Jeśli to ewidentnie URL/strona i NIE wygląda na ścieżkę plikową → przeglądarka
-                if looks_like_url and not looks_like_fs:
+                if _URL_RE.search(low) and not _FS_WORDS_RE.search(low):
                     print(browser.open(line))
                     continue
 
@@ -2526,11 +3368,10 @@ def main():
                     continue
                 if warn:
                     if not confirm(f"⚠️ {warn}. To może być ryzykowne."):
-                        try:
-                            with open(cfg.RUN_ERR_FILE, "a", encoding="utf-8") as f:
-                                f.write(f"[{datetime.now(tz=tz.utc).isoformat(timespec='seconds')}] WARN-SKIP: {warn} for: {cmd}\n---\n")
-                        except Exception:
-                            pass
+                        _LOG_WRITER.append(
+                            cfg.RUN_ERR_FILE,
+                            f"[{datetime.now(tz=tz.utc).isoformat(timespec='seconds')}] WARN-SKIP: {warn} for: {cmd}\n---\n",
+                        )
                         print("⏭️ Pominięto.")
                         continue
                 # Spróbuj najpierw komendę sprzętową (hardware bridge)
@@ -2542,30 +3383,6 @@ def main():
                 print(out)
                 continue
 
-            # AI
-            if line.startswith("ai "):
-                prompt = line[3:].strip()
-                print(api.ask_ai(prompt, execute=False, note="ai"))
-                print(api.meter.summary())
-                continue
-
-            # CODE
-            if line.startswith("code "):
-                rest = line[5:].strip()
-                filename = None
-                m = re.match(r'^([A-Za-z0-9_\-./]+?\.(?:py|sh|bash))\s*:\s*(.*)$', rest)
-                if m:
-                    filename, pr = m.group(1), m.group(2).strip()
-                else:
-                    parts = rest.split(maxsplit=1)
-                    if len(parts) == 2 and re.match(r'^[A-Za-z0-9_\-./]+?\.(?:py|sh|bash)$', parts[0]):
-                        filename, pr = parts[0], parts[1].strip()
-                    else:
-                        pr = rest
-                print(api.generate_and_run_code(pr, filename=filename))
-                print(api.meter.summary())
-                continue
-
             # STRICT: wszystko inne = komenda systemowa
             if cfg.STRICT_MODE:
                 cmd = line
@@ -2583,7 +3400,8 @@ def main():
                 continue
 
             # Fallback: rozmowa
-            print(api.ask_ai(line, execute=False, note="fallback"))
+            api.ask_ai(line, execute=False, note="fallback", stream=True)
+            print()
             print(api.meter.summary())
 
         except KeyboardInterrupt:
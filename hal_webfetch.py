@@ -1,30 +1,115 @@
 import sys
+import json
+import asyncio
+import atexit
 import traceback
 import re
-from playwright.sync_api import sync_playwright
-from readability import Document
+
+try:
+    from selectolax.lexbor import LexborHTMLParser  # parser w C, opcjonalny
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import re2 as _fast_re  # google-re2: automat DFA, czas liniowy, bez backtrackingu
+except ImportError:
+    _fast_re = re
 
 MAX_TEXT_LEN = 150_000
+SHORT_TEXT_LEN = 8_000       # krótsza strona: Readability nie ma czego wycinać
+MIN_ARTICLE_TEXT_LEN = 500   # <article>/<main> z taką ilością tekstu bierzemy wprost
+MAX_PARALLEL = 4             # ile contextów Chromium naraz w trybie --serve
+# twardy limit na zapytanie w --serve (kolejka + goto + networkidle + ekstrakcja), s;
+# musi być krótszy niż FETCH_TIMEOUT klienta w modules/tools/web_fetch.py
+REQUEST_DEADLINE = 25
+
+_SKIP_TAGS = ["script", "style", "noscript"]
+# bez backreferencji i z flagami inline — składnia wspólna dla re i re2
+_SKIP_RE = _fast_re.compile(
+    r"(?is)<script\b.*?</script\s*>|<style\b.*?</style\s*>|<noscript\b.*?</noscript\s*>"
+)
+_BR_RE = _fast_re.compile(r"(?i)<br\s*/?>")
+_TAG_RE = _fast_re.compile(r"<[^>]*>")
 
 
 def strip_html(s: str) -> str:
-    s = re.sub(r"<br\s*/?>", "\n", s, flags=re.IGNORECASE)
-    s = re.sub(r"<.*?>", "", s)
-    return s
+    # wejście przycinamy z zapasem — tekst i tak jest potem obcinany do MAX_TEXT_LEN
+    s = s[:MAX_TEXT_LEN * 4]
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(s)
+        tree.strip_tags(_SKIP_TAGS)
+        for br in tree.css("br"):
+            br.replace_with("\n")
+        return (tree.body or tree.root).text(separator="")[:MAX_TEXT_LEN]
+    s = _SKIP_RE.sub("", s)
+    s = _BR_RE.sub("\n", s)
+    return _TAG_RE.sub("", s)[:MAX_TEXT_LEN]
+
+
+_PW = None
+_BROWSER = None
+
+
+def _close_browser() -> None:
+    global _PW, _BROWSER
+    try:
+        if _BROWSER is not None:
+            _BROWSER.close()
+    finally:
+        _BROWSER = None
+        if _PW is not None:
+            _PW.stop()
+            _PW = None
+
+
+def _get_browser():
+    """Chromium startuje raz na proces; kolejne URL-e dostają tylko świeży context."""
+    global _PW, _BROWSER
+    if _BROWSER is None or not _BROWSER.is_connected():
+        if _PW is None:
+            from playwright.sync_api import sync_playwright
+            _PW = sync_playwright().start()
+            atexit.register(_close_browser)
+        _BROWSER = _PW.chromium.launch(headless=True)
+    return _BROWSER
 
 
 def fetch_rendered_html(url: str) -> str:
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    ctx = _get_browser().new_context()
+    try:
+        page = ctx.new_page()
         page.goto(url, timeout=20000)
         page.wait_for_load_state("networkidle")
-        html = page.content()
-        browser.close()
-        return html
+        return page.content()
+    finally:
+        ctx.close()
+
+
+def _direct_text(html: str):
+    """
+    Tekst bez scoringu Readability, gdy strona na to pozwala: treść z <article>/<main>
+    albo cała strona, jeśli widocznego tekstu jest mało. None = trzeba Readability.
+    """
+    from lxml import html as lxml_html  # zależność readability — zawsze obecna razem z nią
+    try:
+        tree = lxml_html.fromstring(html)
+    except Exception:
+        return None
+    for node in tree.xpath("//script|//style|//noscript"):
+        node.drop_tree()
+    for node in tree.xpath("//article|//main"):
+        text = node.text_content().strip()
+        if len(text) > MIN_ARTICLE_TEXT_LEN:
+            return text
+    text = tree.text_content().strip()
+    return text if len(text) < SHORT_TEXT_LEN else None
 
 
 def extract_readable(html: str) -> str:
+    text = _direct_text(html)
+    if text is not None:
+        return text
+    from readability import Document
     try:
         doc = Document(html)
         parsed = doc.summary(html_partial=False)
@@ -34,11 +119,94 @@ def extract_readable(html: str) -> str:
         return strip_html(html)
 
 
+async def _fetch_async(browser, url: str) -> str:
+    ctx = await browser.new_context()
+    try:
+        page = await ctx.new_page()
+        await page.goto(url, timeout=20000)
+        await page.wait_for_load_state("networkidle")
+        return await page.content()
+    finally:
+        await ctx.close()
+
+
+async def _serve_async() -> None:
+    from playwright.async_api import async_playwright
+
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(MAX_PARALLEL)
+    launch_lock = asyncio.Lock()
+    tasks = set()
+
+    async with async_playwright() as p:
+        state = {"browser": await p.chromium.launch(headless=True)}
+
+        async def get_browser():
+            async with launch_lock:
+                if not state["browser"].is_connected():
+                    state["browser"] = await p.chromium.launch(headless=True)
+                return state["browser"]
+
+        async def work(url: str) -> str:
+            async with sem:
+                html = await _fetch_async(await get_browser(), url)
+                # lxml/Readability to CPU — poza pętlą, żeby nie blokować innych pobrań
+                return await asyncio.to_thread(extract_readable, html)
+
+        async def handle(req_id, url: str) -> None:
+            # limit liczony od przyjęcia zapytania, razem z czekaniem na wolny slot
+            try:
+                text = await asyncio.wait_for(work(url), REQUEST_DEADLINE)
+                resp = {"id": req_id, "ok": True, "text": text[:MAX_TEXT_LEN]}
+            except asyncio.TimeoutError:
+                resp = {"id": req_id, "ok": False, "error": "timeout",
+                        "details": f"przekroczono {REQUEST_DEADLINE}s"}
+            except Exception as e:
+                resp = {"id": req_id, "ok": False, "error": str(e),
+                        "details": traceback.format_exc()[-2000:]}
+            # jedna linia na odpowiedź; między write a flush nie ma await, więc linie się nie przeplatają
+            sys.stdout.write(json.dumps(resp, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                req = json.loads(line)
+            except ValueError:
+                req = {"id": None, "url": line}  # goły URL, jak w pierwszej wersji protokołu
+            task = asyncio.create_task(handle(req.get("id"), req.get("url", "")))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        await state["browser"].close()
+
+
+def serve() -> None:
+    """
+    Tryb workera: linie JSON {"id": ..., "url": ...} na stdin, linie JSON
+    {"id": ..., "ok": true, "text": ...} / {"id": ..., "ok": false, "error": ...} na stdout.
+    Do MAX_PARALLEL stron renderuje się naraz (async Playwright, jeden Chromium),
+    więc odpowiedzi mogą przychodzić w innej kolejności niż zapytania.
+    """
+    asyncio.run(_serve_async())
+
+
 def main() -> None:
     if len(sys.argv) < 2:
-        print("Użycie: hal_webfetch.py <URL>", file=sys.stderr)
+        print("Użycie: hal_webfetch.py <URL> | --serve", file=sys.stderr)
         sys.exit(1)
 
+    if sys.argv[1] == "--serve":
+        serve()
+        return
+
     url = sys.argv[1]
     try:
         html = fetch_rendered_html(url)
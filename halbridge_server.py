@@ -1,21 +1,35 @@
 # v2
 import os
+import hmac
+import hashlib
+import functools
 import subprocess
 import json
 import re
-from flask import Flask, request, jsonify, make_response
+import select
+import shlex
+import secrets
+import signal
+import threading
+import time
+from flask import Flask, request, jsonify, make_response, send_file, redirect, url_for
 from gpt_chat_v2 import GPTChatAPI, Config
-from self_modifier import start_self_modification_loop, stop_self_modification, AI_SELF_MODIFY
 from threading import Thread
 from pathlib import Path
 import shutil
 import traceback
-from hardware_bridge import HardwareBridge
-bridge = HardwareBridge()
 try:
     from modules.bus import BUS
 except Exception:
     BUS = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 # === DIAGNOSTYKA SERWERA HALBRIDGE (SELF-HEALING) ===
 
@@ -88,21 +102,162 @@ api = GPTChatAPI(config)
 
 # --- AUTORYZACJA ---
 API_TOKEN = os.getenv("HALBRIDGE_TOKEN", "bardzo_sekretny_token")
+_EXPECTED_AUTH = f"Bearer {API_TOKEN}".encode("utf-8")
 
 def check_token():
-    token = request.headers.get("Authorization", "")
-    return token == f"Bearer {API_TOKEN}"
+    # porównanie w stałym czasie — bez wycieku długości wspólnego prefiksu
+    token = request.headers.get("Authorization", "").encode("utf-8")
+    return hmac.compare_digest(token, _EXPECTED_AUTH)
 
 @app.before_request
 def auth():
-    if request.method != "OPTIONS":
-        if not check_token():
-            return jsonify(error="Unauthorized"), 401
+    # preflight CORS obsługuje automatyczny OPTIONS Flaska — bez tokenu
+    if request.method == "OPTIONS":
+        return None
+    if not check_token():
+        return jsonify(error="Unauthorized"), 401
+
+# --- POWŁOKA DLA FALLBACKU /run-command ---
+
+# limit czasu polecenia w trwałym bashu (s); 0 = bez limitu, jak przy jednorazowym subprocess
+SHELL_TIMEOUT = float(os.getenv("HALBRIDGE_SHELL_TIMEOUT", "60"))
+
+
+class ShellWorker:
+    """
+    Jeden długo żyjący bash zamiast fork+exec /bin/sh na każde polecenie.
+    Komenda idzie jako `eval '<cytat>'` w subshellu: błąd składni nie rozjedzie
+    protokołu, a `cd`/`export` nie przeciekają do kolejnych poleceń.
+    Koniec wyjścia wyznacza znacznik z losowym tokenem i kodem wyjścia.
+    Bash ma własną grupę procesów — timeout zabija całe drzewo, nie tylko basha.
+    """
+    UNSAFE_CHARS = ("\n", "\r", "\x00", "\x1e")
+
+    def __init__(self, timeout: float = SHELL_TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._proc = None
+        self._mark = f"\x1e{secrets.token_hex(8)} ".encode()
+
+    def _ensure(self):
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ["bash", "--noprofile", "--norc"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                bufsize=0, start_new_session=True,
+            )
+        return self._proc
+
+    def _kill(self):
+        if self._proc is not None:
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            try:
+                self._proc.wait(timeout=5)
+            except Exception:
+                pass
+            self._proc = None
+
+    @staticmethod
+    def _backgrounds(cmd: str) -> bool:
+        """Czy komenda puszcza coś w tło (`&`) — jego wyjście trafiłoby do następnego żądania."""
+        try:
+            lex = shlex.shlex(cmd, posix=True, punctuation_chars=True)
+            lex.whitespace_split = True
+            lex.commenters = ""
+            return "&" in list(lex)
+        except ValueError:
+            return True
+
+    def _drain(self, fd) -> None:
+        """Odrzuca zaległe bajty (np. z procesu, który sam się odłączył) przed nowym poleceniem."""
+        while select.select([fd], [], [], 0)[0]:
+            if not os.read(fd, 65536):
+                break
+
+    def run(self, cmd: str):
+        """(kod_wyjścia, wyjście) albo None — wtedy wywołujący robi jednorazowy subprocess."""
+        if any(ch in cmd for ch in self.UNSAFE_CHARS) or self._backgrounds(cmd):
+            return None
+        # zajęty (równoległe żądanie) → nie kolejkujemy, niech idzie osobnym procesem
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            proc = self._ensure()
+            fd = proc.stdout.fileno()
+            self._drain(fd)
+            mark = self._mark.decode()
+            line = f"( eval {shlex.quote(cmd)} ) </dev/null 2>&1; printf '%s%d\\036\\n' '{mark}' $?\n"
+            proc.stdin.write(line.encode("utf-8"))
+            buf = bytearray()
+            deadline = time.monotonic() + self.timeout if self.timeout > 0 else None
+            while True:
+                idx = buf.rfind(self._mark)
+                if idx != -1 and buf.endswith(b"\x1e\n"):
+                    rc = int(buf[idx + len(self._mark):-2])
+                    return rc, buf[:idx].decode("utf-8", errors="replace")
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and (left <= 0 or not select.select([fd], [], [], left)[0]):
+                    self._kill()
+                    return 124, f"⏱️ Timeout ({self.timeout:.0f}s)"
+                chunk = os.read(fd, 65536)
+                if not chunk:  # bash padł
+                    self._kill()
+                    return None
+                buf += chunk
+        except OSError:
+            self._kill()
+            return None
+        finally:
+            self._lock.release()
+
+
+shell = ShellWorker()
+
+# --- ETAG DLA ODPYTYWANYCH GET-ÓW ---
+
+def _body_etag(body: bytes) -> str:
+    if xxhash is not None:
+        return xxhash.xxh64_hexdigest(body)
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+def etag_cached(view):
+    """
+    ETag z treści odpowiedzi + If-None-Match → 304 bez body (make_conditional Werkzeuga).
+    Jeśli widok sam ustawił ETag (np. z mtime pliku), nie liczymy hasha.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        resp = make_response(view(*args, **kwargs))
+        if resp.status_code != 200:
+            return resp
+        if "ETag" not in resp.headers:
+            resp.set_etag(_body_etag(resp.get_data()))
+        return resp.make_conditional(request)
+    return wrapper
 
 # --- ENDPOINTY GŁÓWNE ---
 
-from hardware_bridge import HardwareBridge
-bridge = HardwareBridge()
+# Ciężkie moduły ładowane przy pierwszym użyciu, nie przy starcie serwera:
+# self_modifier tworzy własne GPTChatAPI, HardwareBridge czyta konfigurację urządzeń.
+_bridge = None
+_bridge_lock = threading.Lock()
+
+def get_bridge():
+    global _bridge
+    if _bridge is None:
+        # dwa pierwsze równoległe żądania nie mogą zbudować dwóch mostków (osobny stan, dwa flushe atexit)
+        with _bridge_lock:
+            if _bridge is None:
+                from hardware_bridge import HardwareBridge
+                _bridge = HardwareBridge()
+    return _bridge
+
+def _self_modifier():
+    import self_modifier
+    return self_modifier
 
 @app.route('/run-command', methods=['POST'])
 def run_command():
@@ -116,7 +271,7 @@ def run_command():
     # 1) Spróbuj najpierw wykonać komendę sprzętową
     result = None
     try:
-        result = bridge.execute(cmd)
+        result = get_bridge().execute(cmd)
         if result:
             print(f"[⚙️ HARDWARE] {result}")
     except Exception as e:
@@ -132,25 +287,59 @@ def run_command():
 
     # 3) Ostatecznie, jeśli agent też nie rozpoznał → shell fallback
     if not result:
-        try:
-            out = subprocess.check_output(
-                cmd, shell=True, stderr=subprocess.STDOUT, text=True
-            )
-            result = out.strip()
-        except subprocess.CalledProcessError as e:
-            result = (e.output or "").strip() or str(e)
+        res = shell.run(cmd)
+        if res is not None:
+            rc, out = res
+            result = out.strip() or (f"Command '{cmd}' returned non-zero exit status {rc}." if rc else "")
+        else:
+            try:
+                out = subprocess.check_output(
+                    cmd, shell=True, stderr=subprocess.STDOUT, text=True
+                )
+                result = out.strip()
+            except subprocess.CalledProcessError as e:
+                result = (e.output or "").strip() or str(e)
 
     wrapped = f"@#@{result}@#@" if isinstance(result, str) else f"@#@{str(result)}@#@"
     return jsonify(result=wrapped)
 
+# Pliki większe niż próg idą strumieniem (bez str w pamięci i bez escapowania JSON)
+STREAM_THRESHOLD = 256 * 1024
+
+def _sandboxed_path(path: str):
+    """Ścieżka po sprawdzeniu sandboxa agenta (FileOps) albo None, gdy API go nie udostępnia."""
+    files = getattr(api, "files", None)
+    if files is None or not hasattr(files, "_resolve"):
+        return None
+    try:
+        rp = files._resolve(path)
+    except Exception:
+        return None
+    return rp if files._is_safe(rp) and rp.is_file() else None
+
 @app.route('/read-file', methods=['POST'])
 def read_file():
     path = request.json.get("path")
     if not path:
         return jsonify(error="Brak ścieżki"), 400
+    rp = _sandboxed_path(path)
+    if rp is not None and rp.stat().st_size > STREAM_THRESHOLD:
+        # 307 zachowuje metodę i body — klient dostaje surowe bajty z /read-file-stream
+        return redirect(url_for("read_file_stream"), code=307)
     result = api.read_file(path)
     return jsonify(result=result)
 
+@app.route('/read-file-stream', methods=['POST'])
+def read_file_stream():
+    path = (request.get_json(silent=True) or {}).get("path")
+    if not path:
+        return jsonify(error="Brak ścieżki"), 400
+    rp = _sandboxed_path(path)
+    if rp is None:
+        return jsonify(error="Brak pliku lub poza sandboxem"), 404
+    # send_file oddaje plik kawałkami (wsgi.file_wrapper / sendfile), obsługuje Range
+    return send_file(rp, mimetype="application/octet-stream", conditional=True)
+
 @app.route('/write-file', methods=['POST'])
 def write_file():
     data = request.json
@@ -162,10 +351,12 @@ def write_file():
     return jsonify(result=result)
 
 @app.route('/history', methods=['GET'])
+@etag_cached
 def history():
     return jsonify(history=api.get_history())
 
 @app.route('/status', methods=['GET'])
+@etag_cached
 def status():
     return jsonify(status="OK", user=os.getenv("USER") or os.getenv("USERNAME"))
 
@@ -174,7 +365,7 @@ def status():
 @app.route('/start-self-modification', methods=['POST'])
 def start_self_mod():
     try:
-        t = Thread(target=start_self_modification_loop, daemon=True)
+        t = Thread(target=_self_modifier().start_self_modification_loop, daemon=True)
         t.start()
         return jsonify(status="OK", message="Pętla samomodyfikacji uruchomiona."), 200
     except Exception as e:
@@ -183,7 +374,7 @@ def start_self_mod():
 @app.route('/stop-self-modification', methods=['POST'])
 def stop_self_mod():
     try:
-        stop_self_modification()
+        _self_modifier().stop_self_modification()
         return jsonify(status="OK", message="Samomodyfikacja zatrzymana."), 200
     except Exception as e:
         return jsonify(error=str(e)), 500
@@ -191,15 +382,20 @@ def stop_self_mod():
 # --- ENDPOINTY KONTROLNE ---
 
 @app.route('/self-mod-status', methods=['GET'])
+@etag_cached
 def self_mod_status():
-    return jsonify(active=AI_SELF_MODIFY)
+    # odczyt z modułu, nie kopia nazwy z importu — flaga zmienia się w trakcie działania
+    return jsonify(active=_self_modifier().AI_SELF_MODIFY)
 
 @app.route('/list-backups', methods=['GET'])
+@etag_cached
 def list_backups():
-    restore_dir = Path(".restore_points")
-    if not restore_dir.exists():
-        return jsonify(backups=[])
-    backups = sorted([p.name for p in restore_dir.iterdir() if p.is_dir()], reverse=True)
+    # scandir: typ wpisu przychodzi z getdents, bez osobnego stat() na każdy katalog
+    try:
+        with os.scandir(".restore_points") as it:
+            backups = sorted((e.name for e in it if e.is_dir()), reverse=True)
+    except FileNotFoundError:
+        backups = []
     return jsonify(backups=backups)
 
 @app.route('/restore-backup/<backup_name>', methods=['POST'])
@@ -215,23 +411,49 @@ def restore_backup(backup_name):
             "session_memory.json"
         ]
 
+        with os.scandir(source) as it:
+            present = {e.name for e in it if e.is_file()}
+
         for filename in files_to_restore:
-            src = source / filename
-            if src.exists():
+            if filename in present:
+                src = source / filename
                 Path(filename).write_text(src.read_text(encoding="utf-8"), encoding="utf-8")
 
         return jsonify(status="OK", message=f"Przywrócono backup: {backup_name}"), 200
     except Exception as e:
         return jsonify(error=str(e)), 500
 
+MOD_LOG_PATH = Path("modification_log.json")
+# (mtime_ns, rozmiar) → sparsowany log; parsujemy ponownie tylko po zmianie pliku
+_mod_log_cache = {"key": None, "data": []}
+
+def _mod_log_key():
+    st = MOD_LOG_PATH.stat()
+    return (st.st_mtime_ns, st.st_size)
+
+def _load_mod_log(key=None):
+    key = key or _mod_log_key()
+    if key != _mod_log_cache["key"]:
+        raw = MOD_LOG_PATH.read_bytes()
+        _mod_log_cache["data"] = orjson.loads(raw) if orjson else json.loads(raw)
+        _mod_log_cache["key"] = key
+    return _mod_log_cache["data"]
+
 @app.route('/mod-log', methods=['GET'])
+@etag_cached
 def mod_log():
-    log_path = Path("modification_log.json")
-    if not log_path.exists():
+    if not MOD_LOG_PATH.exists():
         return jsonify(log=[])
     try:
-        data = json.loads(log_path.read_text(encoding="utf-8"))
-        return jsonify(log=data)
+        # ETag z (mtime, rozmiar): niezmieniony plik → 304 bez parsowania, serializacji i hasha
+        key = _mod_log_key()
+        etag = "ml-%x-%x" % key
+        if request.if_none_match.contains(etag):
+            resp = make_response("", 304)
+        else:
+            resp = jsonify(log=_load_mod_log(key))
+        resp.set_etag(etag)
+        return resp
     except Exception as e:
         return jsonify(error="Nie można odczytać logu", details=str(e)), 500
 
@@ -248,15 +470,26 @@ class PromptRelay:
         self.agent_url = agent_url
         self.token = token
         self.timeout = timeout
+        self._session = None
         self._register_routes()
 
+    def _get_session(self):
+        """Jedna sesja z pulą połączeń keep-alive — bez nowego TCP/TLS na każdy prompt."""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Content-Type": "application/json"})
+            if self.token:
+                session.headers["Authorization"] = f"Bearer {self.token}"
+            self._session = session
+        return self._session
+
     def _post_to_agent(self, payload: dict):
-        import requests
-        headers = {"Content-Type": "application/json"}
-        if self.token:
-            headers["Authorization"] = f"Bearer {self.token}"
-        resp = requests.post(self.agent_url, json=payload, headers=headers, timeout=self.timeout)
-        return resp
+        return self._get_session().post(self.agent_url, json=payload, timeout=self.timeout)
 
     def _json_or_text(self, resp):
         try:
@@ -296,7 +529,7 @@ class PromptRelay:
 
 @app.route('/healthz', methods=['GET'])
 def healthz():
-    return jsonify(ok=Tre), 200
+    return jsonify(ok=True), 200
 
 @app.route("/webfetch", methods=["POST"])
 def webfetch():
@@ -306,8 +539,9 @@ def webfetch():
         if not url:
             return jsonify({"error": "missing url"}), 400
 
-        from modules.tools.web_fetch import registry
-        result = registry.invoke("web_fetch", {"url": url})
+        # worker Playwright żyje w module web_fetch — jeden Chromium na cały serwer
+        from modules.tools import web_fetch
+        result = web_fetch.invoke({"url": url})
 
         return jsonify({
             "ok": True,
@@ -317,6 +551,18 @@ def webfetch():
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+CERT_FILE = "/opt/halbridge/certs/cert.pem"
+KEY_FILE = "/opt/halbridge/certs/key.pem"
+
+def _ssl_context():
+    import ssl
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.minimum_version = ssl.TLSVersion.TLSv1_2
+    ctx.load_cert_chain(CERT_FILE, KEY_FILE)
+    ctx.set_alpn_protocols(["http/1.1"])  # Werkzeug nie mówi HTTP/2
+    return ctx
+
 if __name__ == "__main__":
+    # Tryb deweloperski; produkcyjnie: gunicorn z wsgi.py (patrz tam)
     print("🚀 Serwer HalBridge rusza z HTTPS na porcie 5000...")
-    app.run(host="0.0.0.0", port=5000, ssl_context=('/opt/halbridge/certs/cert.pem', '/opt/halbridge/certs/key.pem'))
+    app.run(host="0.0.0.0", port=5000, ssl_context=_ssl_context(), threaded=True, processes=1)
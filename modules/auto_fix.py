@@ -8,7 +8,8 @@ i jeśli przejdzie kompilację i sandbox — zapisuje.
 """
 
 from pathlib import Path
-import json, shutil, time, py_compile, tempfile
+import json, shutil, time, py_compile, tempfile, hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- Importy zależne ---
 try:
@@ -26,6 +27,13 @@ try:
 except Exception:
     code_registry = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from modules.auto_heal import tail_lines
+
 
 LOG = Path.home() / ".local/share/halbridge/auto_patch.log"
 
@@ -36,9 +44,10 @@ def load_failures(limit=20):
     if not LOG.exists():
         return []
     out = []
-    for line in LOG.read_text(encoding="utf-8").splitlines()[-limit:]:
+    loads = orjson.loads if orjson else json.loads
+    for line in tail_lines(LOG, limit):
         try:
-            out.append(json.loads(line))
+            out.append(loads(line))
         except:
             pass
     return out
@@ -48,18 +57,43 @@ def backup_file(path: Path):
     shutil.copy2(path, bak)
     return bak
 
+# wyniki sprawdzeń po skrócie treści — ten sam kandydat od modelu nie jest kompilowany/uruchamiany dwa razy
+_compile_cache: dict[bytes, bool] = {}
+_sandbox_cache: dict[bytes, tuple[float, bool]] = {}
+SANDBOX_CACHE_TTL = 300  # s — wynik sandboxa zależy też od otoczenia, więc krócej niż kompilacja
+_CACHE_MAX = 256
+
+def _content_key(path: Path) -> bytes:
+    return hashlib.blake2b(path.read_bytes(), digest_size=16).digest()
+
 def _compile_ok(path: Path) -> bool:
-    try:
-        py_compile.compile(str(path), doraise=True)
-        return True
-    except Exception:
-        return False
+    key = _content_key(path)
+    ok = _compile_cache.get(key)
+    if ok is None:
+        try:
+            py_compile.compile(str(path), doraise=True)
+            ok = True
+        except Exception:
+            ok = False
+        if len(_compile_cache) >= _CACHE_MAX:
+            _compile_cache.clear()
+        _compile_cache[key] = ok
+    return ok
 
 def _sandbox_ok(path: Path) -> bool:
     if not code_sandbox:
         return True
+    key = _content_key(path)
+    now = time.monotonic()
+    hit = _sandbox_cache.get(key)
+    if hit and now - hit[0] < SANDBOX_CACHE_TTL:
+        return hit[1]
     res = code_sandbox.run_file(str(path), profile="headless")
-    return bool(res.get("ok"))
+    ok = bool(res.get("ok"))
+    if len(_sandbox_cache) >= _CACHE_MAX:
+        _sandbox_cache.clear()
+    _sandbox_cache[key] = (now, ok)
+    return ok
 
 
 # ======================================================================
@@ -90,43 +124,51 @@ def attempt_fix(path: Path, stderr: str):
         "---------------------------\n"
     )
 
-    for n in range(1, 4):
-        print(f"  ▶ próba {n}/3")
+    # 3 zapytania naraz (czekanie na model to głównie sieć);
+    # kandydaci sprawdzani po kolei w miarę nadchodzenia, pierwszy poprawny wygrywa
+    print("  ▶ 3 próby równolegle")
+    ex = ThreadPoolExecutor(max_workers=3)
+    futures = {ex.submit(intelligence.suggest_fix, prompt): n for n in range(1, 4)}
+    try:
+        for fut in as_completed(futures):
+            n = futures[fut]
+            try:
+                candidate = fut.result()
+            except Exception as e:
+                print(f"  ❌ [{n}/3] Błąd przy komunikacji z intelligence:", e)
+                continue
+
+            if not isinstance(candidate, str) or len(candidate.strip()) < 5:
+                print(f"  ❌ [{n}/3] Odpowiedź AI nie wygląda jak kod — pomijam")
+                continue
+
+            tmp = Path(tempfile.gettempdir()) / f"afix_{int(time.time())}_{n}_{path.name}"
+            tmp.write_text(candidate, encoding="utf-8")
+
+            if not _compile_ok(tmp):
+                print(f"  ❌ [{n}/3] kompilacja nieudana — czekam na kolejną")
+                continue
+
+            if not _sandbox_ok(tmp):
+                print(f"  ❌ [{n}/3] sandbox nie zaakceptował — czekam na kolejną")
+                continue
+
+            # Sukces — zapisujemy
+            backup_file(path)
+            path.write_text(candidate, encoding="utf-8")
+            print(f"  ✅ [{n}/3] Poprawka zatwierdzona i zapisana.")
+
+            if code_registry:
+                code_registry.register_path(
+                    str(path),
+                    project="auto-fix",
+                    meta={"ts": _now(), "src": "auto_fix", "status": "applied"},
+                )
 
-        try:
-            candidate = intelligence.suggest_fix(prompt)
-        except Exception as e:
-            print("  ❌ Błąd przy komunikacji z intelligence:", e)
             return
-
-        if not isinstance(candidate, str) or len(candidate.strip()) < 5:
-            print("  ❌ Odpowiedź AI nie wygląda jak kod — pomijam")
-            continue
-
-        tmp = Path(tempfile.gettempdir()) / f"afix_{int(time.time())}_{path.name}"
-        tmp.write_text(candidate, encoding="utf-8")
-
-        if not _compile_ok(tmp):
-            print("  ❌ kompilacja nieudana — kolejna próba")
-            continue
-
-        if not _sandbox_ok(tmp):
-            print("  ❌ sandbox nie zaakceptował — kolejna próba")
-            continue
-
-        # Sukces — zapisujemy
-        backup_file(path)
-        path.write_text(candidate, encoding="utf-8")
-        print("  ✅ Poprawka zatwierdzona i zapisana.")
-
-        if code_registry:
-            code_registry.register_path(
-                str(path),
-                project="auto-fix",
-                meta={"ts": _now(), "src": "auto_fix", "status": "applied"},
-            )
-
-        return
+    finally:
+        # nie czekamy na spóźnione odpowiedzi
+        ex.shutdown(wait=False, cancel_futures=True)
 
     print("❌ Nie udało się naprawić pliku po 3 próbach.")
 
@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from pathlib import Path
-import json, time
+import os, json, time
 try:
     from modules.bus import BUS
 except Exception:
     BUS = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 DATA = Path.home() / ".local" / "share" / "halbridge"
 DATA.mkdir(parents=True, exist_ok=True)
@@ -13,17 +21,49 @@ LOG = DATA / "auto_patch.log"
 
 def _now(): return time.strftime("%Y-%m-%dT%H:%M:%S")
 
+def tail_lines(path: Path, n: int, chunk: int = 4096) -> list[str]:
+    """Ostatnie n linii pliku — czytane od końca blokami po 4 KiB, bez wczytywania całości."""
+    if n <= 0:
+        return []
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        buf = b""
+        # n+1 znaków nowej linii gwarantuje, że n ostatnich linii jest kompletnych
+        while pos > 0 and buf.count(b"\n") <= n:
+            step = min(chunk, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+    parts = buf.split(b"\n")
+    if parts and not parts[-1]:
+        parts.pop()
+    return [p.decode("utf-8", errors="replace") for p in parts[-n:]]
+
 def record_failure(src: str, path: str | None, stderr: str, meta: dict | None = None):
     rec = {"ts": _now(), "src": src, "path": path, "stderr": (stderr or "")[:4000], "meta": meta or {}}
-    with LOG.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    if orjson:
+        line = orjson.dumps(rec, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+    else:
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+    # jeden write() na O_APPEND — równoległe procesy (auto_fix, pętla główna) nie przeplatają linii;
+    # flock dla rekordów dłuższych niż gwarancja atomowości
+    fd = os.open(LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        view = memoryview(line)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
     if BUS:
         BUS.publish("code.error", {"src": src, "path": path, "short": (stderr or "")[:200]})
 
 def scan_and_list(limit: int = 50):
     if not LOG.exists(): return []
     out = []
-    for line in LOG.read_text(encoding="utf-8").splitlines()[-limit:]:
-        try: out.append(json.loads(line))
+    loads = orjson.loads if orjson else json.loads
+    for line in tail_lines(LOG, limit):
+        try: out.append(loads(line))
         except Exception: pass
     return out
@@ -48,17 +48,23 @@ def save_artifact(content: str, *, project: Optional[str], filename: Optional[st
         f.write(json.dumps(rec, ensure_ascii=False) + "\n")
     return rec
 
-def register_path(path: str, *, project: Optional[str], meta: Optional[Dict]=None) -> Dict:
-    """Rejestruje istniejący plik na dysku jako artefakt projektu."""
+def register_path(path: str, *, project: Optional[str], meta: Optional[Dict]=None,
+                  precomputed_sha: Optional[str]=None) -> Dict:
+    """Rejestruje istniejący plik na dysku jako artefakt projektu.
+    precomputed_sha: SHA256 treści znanej wołającemu — plik nie jest wtedy czytany."""
     proj_dir = ensure_project(project)
     src = Path(path).expanduser().resolve()
-    data = src.read_bytes()
+    if precomputed_sha:
+        sha, size = precomputed_sha, src.stat().st_size
+    else:
+        data = src.read_bytes()
+        sha, size = _sha256(data), len(data)
     rec = {
         "ts": _now(),
         "project": proj_dir.name,
         "file": str(src),
-        "sha256": _sha256(data),
-        "size": len(data),
+        "sha256": sha,
+        "size": size,
         "meta": meta or {},
     }
     with REG_PATH.open("a", encoding="utf-8") as f:
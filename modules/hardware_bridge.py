@@ -8,10 +8,18 @@ oraz prostą autokorektą literówek.
 """
 
 from __future__ import annotations
+import os
 import json
+import logging
 import re
+import shlex
+import atexit
+import threading
 import difflib
+import functools
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Dict, List, Tuple
 
@@ -25,6 +33,19 @@ try:
 except Exception:
     requests = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+except Exception:
+    rf_process = rf_fuzz = None
+
+# diagnostyka idzie do logów (poziom do wyciszenia globalnie); print zostaje dla dialogu z użytkownikiem
+logger = logging.getLogger(__name__)
+
 # ==========================================
 # Ścieżki
 # ==========================================
@@ -34,6 +55,8 @@ DEFAULT_CONFIG = "/home/hal/HALbridge/device_commands.json"
 STATE_DIR = Path("~/.local/share/halbridge").expanduser()
 STATE_DIR.mkdir(parents=True, exist_ok=True)
 STATE_PATH = STATE_DIR / "hw_context.json"
+# zapis kontekstu najpóźniej po tylu sekundach od pierwszej zmiany (seria komend = jeden zapis)
+SAVE_DEBOUNCE = 0.5
 
 # ==========================================
 # Mapowanie na Shelly (LIVE)
@@ -43,38 +66,39 @@ _SHELLY_LIGHT_MAP_RAW = {
     "światło 1": {"ip": "192.168.100.12", "id": 0},
     "światło 2": {"ip": "192.168.100.12", "id": 1},
 }
-# klucze znormalizowane tak jak _slug()
-# (żeby "światlo 1" z device_commands.json pasowało)
-def _tmp_slug_for_map(s: str) -> str:
-    s = s.lower()
-    s = (
-        s.replace("ą", "a").replace("ć", "c").replace("ę", "e")
-        .replace("ł", "l").replace("ń", "n").replace("ó", "o")
-        .replace("ś", "s").replace("ż", "z").replace("ź", "z")
-    )
-    return re.sub(r"\s+", " ", s.strip())
-
-SHELLY_LIGHT_MAP: Dict[str, Dict[str, object]] = {
-    _tmp_slug_for_map(k): v for k, v in _SHELLY_LIGHT_MAP_RAW.items()
-}
 
 
 # ==========================================
 # UTIL
 # ==========================================
 
+# usuwanie polskich znaków — jedna tabela dla str.translate zamiast łańcucha replace()
+_PL_ASCII = str.maketrans("ąćęłńóśżź", "acelnoszz")
+
+
+@functools.lru_cache(maxsize=4096)
 def _slug(s: str) -> str:
     if not s:
         return ""
-    t = s.lower()
-    # usuwanie polskich znaków
-    t = (
-        t.replace("ą", "a").replace("ć", "c").replace("ę", "e")
-        .replace("ł", "l").replace("ń", "n").replace("ó", "o")
-        .replace("ś", "s").replace("ż", "z").replace("ź", "z")
-    )
-    # normalizacja spacji
-    return re.sub(r"\s+", " ", t.strip())
+    # split()/join w C normalizuje białe znaki (jak re.sub(r"\s+", " ") po strip())
+    return " ".join(s.lower().translate(_PL_ASCII).split())
+
+
+# klucze znormalizowane tak jak _slug()
+# (żeby "światlo 1" z device_commands.json pasowało)
+SHELLY_LIGHT_MAP: Dict[str, Dict[str, object]] = {
+    _slug(k): v for k, v in _SHELLY_LIGHT_MAP_RAW.items()
+}
+
+# słowa (po _slug, jako podciągi), przy których warto pytać Shelly o stan:
+# człony nazw z SHELLY_LIGHT_MAP bez numerów + rdzenie "świat(ło/ła/eł)" i "lamp(a/y)"
+_SHELLY_HINTS = frozenset(
+    {"swiat", "lamp"}
+    | {tok for dev in SHELLY_LIGHT_MAP for tok in dev.split() if not tok.isdigit()}
+)
+
+# odczyt LIVE młodszy niż tyle sekund jest uznawany za aktualny (seria komend nie odpytuje Shelly ponownie)
+LIVE_STATE_TTL = 0.5
 
 
 def _normalize_spelling(t: str) -> str:
@@ -101,8 +125,90 @@ def _normalize_spelling(t: str) -> str:
     return t
 
 
+# Zapytania o stan — jedyne wejście bez słowa akcji, które execute() obsługuje
+_STATUS_SLUGS = frozenset(("swiatla status", "status swiatel", "swiatla stan", "status swiatla"))
+
+# Wszystko, co _parse_action może uznać za akcję (po slug + autokorekcie).
+# Bez trafienia execute() i tak zwróciłoby None — można pominąć odczyt stanu i Shelly.
+_ACTION_TRIGGER_RE = re.compile(
+    r"wlacz|zaswiec|uruchom|odpal|zalacz|wylacz|zgas|zatrzymaj"
+    r"|\b(?:powtorz|to samo|ponownie|jeszcze raz|odwrotnie|na odwrot|przelacz|toggle)\b"
+)
+
+
+# Wzorce dla tekstu po _slug + _normalize_spelling (ASCII, małe litery)
+_RE_REPEAT = re.compile(r"\b(?:powtorz|to samo|ponownie|jeszcze raz)\b")
+_RE_TOGGLE = re.compile(r"\b(?:odwrotnie|na odwrot|przelacz|toggle)\b")
+# wszystkie słowa akcji naraz — _strip_action_words robi jeden przebieg zamiast trzech
+_RE_ALL_ACTIONS = re.compile(
+    r"\b(?:wlacz|zaswiec|uruchom|odpal|zalacz|wylacz|zgas|zatrzymaj"
+    r"|powtorz|to samo|ponownie|jeszcze raz|odwrotnie|na odwrot|przelacz|toggle)\b"
+)
+_RE_NUM12 = re.compile(r"\b[12]\b")
+# słowa włącz/wyłącz jako podciągi (łapią też odmiany: "wlaczyc", "zgascie")
+_RE_ON = re.compile(r"wlacz|zaswiec|uruchom|odpal|zalacz")
+_RE_OFF = re.compile(r"wylacz|zgas|zatrzymaj")
+
+
+# komendy urządzeń: co wymaga prawdziwego shella (zmienne, globy, potoki, przekierowania);
+# "#" też — komentarz w sh zależy od pozycji w słowie, niech rozstrzyga sam shell
+_SHELL_CHARS_RE = re.compile(r"[$`*?\[~\n#]")
+_SHELL_OPS = frozenset(";|&<>()")
+# curl bez niczego poza cichym GET-em → wprost przez sesję HTTP
+_CURL_FLAGS = frozenset(("-s", "-S", "-sS", "-f", "-fs", "-fsS", "--silent", "--fail"))
+
+
+@functools.lru_cache(maxsize=256)
+def _prepare_command(cmd: str) -> Tuple[str, object]:
+    """
+    Rozkłada komendę z device_commands.json raz:
+      ("http", url)   — prosty `curl URL`, wysyłany przez requests.Session
+      ("argv", [...]) — zwykła komenda, uruchamiana bez pośrednictwa /bin/sh
+      ("shell", cmd)  — wszystko, co potrzebuje shella (jak dotąd)
+    """
+    if _SHELL_CHARS_RE.search(cmd):
+        return "shell", cmd
+    try:
+        lex = shlex.shlex(cmd, posix=True, punctuation_chars=True)
+        lex.whitespace_split = True
+        lex.commenters = ""
+        argv = list(lex)
+    except ValueError:
+        return "shell", cmd
+    if not argv or "=" in argv[0] or any(set(tok) <= _SHELL_OPS for tok in argv):
+        return "shell", cmd
+    if argv[0] == "curl" and requests:
+        urls = [tok for tok in argv[1:] if tok not in _CURL_FLAGS]
+        if len(urls) == 1 and urls[0].startswith(("http://", "https://")):
+            return "http", urls[0]
+    return "argv", argv
+
+
+def _file_key(path: Path) -> Tuple[int, int]:
+    st = path.stat()
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_json(path: Path):
+    """Wczytuje plik JSON (orjson prosto z bajtów, jeśli jest)."""
+    raw = path.read_bytes()
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def might_handle(text: str) -> bool:
+    """
+    Tani filtr bez instancji mostka: False = execute(text) na pewno zwróci None.
+    Pozwala nie budować HardwareBridge dla linii, które nie są komendami sprzętowymi.
+    """
+    if not text:
+        return False
+    slug = _slug(text)
+    return slug in _STATUS_SLUGS or bool(_ACTION_TRIGGER_RE.search(_normalize_spelling(slug)))
+
+
 def _split_targets(text: str) -> List[str]:
-    parts = re.split(r"\s*(?:,| i | oraz )\s*", text, flags=re.IGNORECASE)
+    # tekst przychodzi po _slug (małe litery, pojedyncze spacje), więc wystarczy replace
+    parts = text.replace(" i ", ",").replace(" oraz ", ",").split(",")
     return [p.strip() for p in parts if p.strip()]
 
 
@@ -119,7 +225,8 @@ class HardwareBridge:
     def __init__(self, config_path: str = DEFAULT_CONFIG):
         self.config_path = Path(config_path)
         self.commands: Dict[str, Dict[str, str]] = self._load_commands()
-        self.aliases: Dict[str, List[str] | str] = self._default_aliases()
+        self._index_devices()
+        self.aliases: Dict[str, Tuple[str, ...]] = self._default_aliases()
 
         # kontekst
         self.last_action: Optional[str] = None
@@ -129,6 +236,18 @@ class HardwareBridge:
         self.state: Dict[str, str] = {k: "unknown" for k in self.commands.keys()}
         self.state_source: Dict[str, str] = {k: "memory" for k in self.commands.keys()}
 
+        # LIVE: wspólna sesja HTTP (keep-alive do Shelly) i czas ostatniego odświeżenia
+        self._http = None
+        self._live_at = 0.0
+
+        # odroczony zapis hw_context.json
+        self._save_lock = threading.Lock()
+        self._save_dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        atexit.register(self._flush_context)
+        # (mtime_ns, size) hw_context.json przy ostatnim odczycie/zapisie — _reload_state pomija niezmieniony plik
+        self._state_key: Optional[Tuple[int, int]] = None
+
         # wczytaj kontekst
         self._load_context()
 
@@ -138,49 +257,102 @@ class HardwareBridge:
 
     def _load_commands(self) -> Dict[str, Dict[str, str]]:
         if not self.config_path.exists():
-            print(f"⚠️ Brak pliku {self.config_path}")
+            logger.warning("⚠️ Brak pliku %s", self.config_path)
             return {}
         try:
-            with open(self.config_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # normalizujemy klucze tak jak _slug
-                return {_slug(k): v for k, v in (data or {}).items()}
+            data = _read_json(self.config_path)
+            # normalizujemy klucze tak jak _slug
+            return {_slug(k): v for k, v in (data or {}).items()}
         except Exception as e:
-            print(f"❌ Błąd ładowania device_commands.json: {e}")
+            logger.error("❌ Błąd ładowania device_commands.json: %s", e)
             return {}
 
     def reload(self) -> None:
         """Przeładuj device_commands.json bez restartu."""
+        old_keys = self._device_keys
         self.commands = self._load_commands()
+        self._index_devices()
+        # aliasy trzymają przefiltrowane urządzenia — odbudowa tylko, gdy zmieniła się lista
+        if self._device_keys != old_keys:
+            self.aliases = self._default_aliases()
         for k in self.commands.keys():
             self.state.setdefault(k, "unknown")
             self.state_source.setdefault(k, "memory")
+        # nowe urządzenia mogą mieć zapisany stan — następny _reload_state czyta plik ponownie
+        self._state_key = None
+
+    def _index_devices(self) -> None:
+        """Struktury wyszukiwania po nazwach urządzeń; odbudowywane przy każdym (prze)ładowaniu."""
+        self._device_keys: Tuple[str, ...] = tuple(self.commands)
+        self._device_pos: Dict[str, int] = {d: i for i, d in enumerate(self._device_keys)}
+        # trigram → urządzenia, których nazwa go zawiera (zawężenie dla `key in dev`)
+        self._substr_index: Dict[str, set] = {}
+        for dev in self._device_keys:
+            for i in range(len(dev) - 2):
+                self._substr_index.setdefault(dev[i:i + 3], set()).add(dev)
+        # fuzzy: klucz zapytania → najbliższe urządzenie (albo None)
+        self._fuzzy_cache: Dict[str, Optional[str]] = {}
+
+    def _devices_containing(self, key: str) -> List[str]:
+        """Urządzenia, których nazwa zawiera key — w kolejności z device_commands."""
+        if len(key) < 3:
+            return [dev for dev in self._device_keys if key in dev]
+        cand = None
+        for i in range(len(key) - 2):
+            devs = self._substr_index.get(key[i:i + 3])
+            if not devs:
+                return []
+            cand = set(devs) if cand is None else cand & devs
+            if not cand:
+                return []
+        return sorted((d for d in cand if key in d), key=self._device_pos.__getitem__)
 
     def _save_context(self) -> None:
-        """Zapisuje last_action, last_targets i stan urządzeń do hw_context.json."""
+        """
+        Oznacza kontekst do zapisu; właściwy zapis robi _flush_context w tle
+        po SAVE_DEBOUNCE sekundach (i przy wyjściu z procesu).
+        """
+        with self._save_lock:
+            self._save_dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DEBOUNCE, self._flush_context)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _flush_context(self) -> None:
+        """Zapisuje last_action, last_targets i stan urządzeń do hw_context.json (atomowo)."""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._save_dirty:
+                return
+            self._save_dirty = False
+            obj = {
+                "last_action": self.last_action,
+                "last_targets": list(self.last_targets),
+                "state": dict(self.state),
+                "state_source": dict(self.state_source),
+            }
+        if orjson:
+            payload = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        else:
+            payload = json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
         try:
-            with open(STATE_PATH, "w", encoding="utf-8") as f:
-                json.dump(
-                    {
-                        "last_action": self.last_action,
-                        "last_targets": self.last_targets,
-                        "state": self.state,
-                        "state_source": self.state_source,
-                    },
-                    f,
-                    ensure_ascii=False,
-                    indent=2,
-                )
+            tmp = STATE_PATH.with_name(STATE_PATH.name + ".tmp")
+            tmp.write_bytes(payload)
+            os.replace(tmp, STATE_PATH)
+            self._state_key = _file_key(STATE_PATH)
         except Exception as e:
-            print(f"⚠️ Nie zapisano kontekstu: {e}")
+            logger.warning("⚠️ Nie zapisano kontekstu: %s", e)
 
     def _load_context(self) -> None:
         """Wczytuje last_action, last_targets i stan z hw_context.json (jeśli istnieje)."""
         try:
             if not STATE_PATH.exists():
                 return
-            with open(STATE_PATH, "r", encoding="utf-8") as fh:
-                obj = json.load(fh)
+            self._state_key = _file_key(STATE_PATH)
+            obj = _read_json(STATE_PATH)
 
             self.last_action = obj.get("last_action")
             self.last_targets = obj.get("last_targets", []) or []
@@ -192,15 +364,20 @@ class HardwareBridge:
                 self.state[k] = loaded_state.get(k, "unknown")
                 self.state_source[k] = loaded_source.get(k, "memory")
         except Exception as e:
-            print(f"⚠️ Nie odczytano kontekstu: {e}")
+            logger.warning("⚠️ Nie odczytano kontekstu: %s", e)
 
     def _reload_state(self) -> None:
         """Soft-refresh – wciąga zmiany z hw_context.json."""
+        # niezapisane zmiany w pamięci są nowsze niż plik — nie nadpisujemy ich
+        if self._save_dirty:
+            return
         try:
-            if not STATE_PATH.exists():
+            key = _file_key(STATE_PATH)
+            # plik bez zmian od ostatniego odczytu/zapisu → stan w pamięci jest aktualny
+            if key == self._state_key:
                 return
-            with open(STATE_PATH, "r", encoding="utf-8") as fh:
-                obj = json.load(fh)
+            obj = _read_json(STATE_PATH)
+            self._state_key = key
 
             st = obj.get("state", {}) or {}
             src = obj.get("state_source", {}) or {}
@@ -216,11 +393,16 @@ class HardwareBridge:
     # ALIASY
     # ---------------------------------------------------
 
-    def _default_aliases(self) -> Dict[str, List[str] | str]:
+    def _default_aliases(self) -> Dict[str, Tuple[str, ...]]:
         """Aliasowanie nazw urządzeń + zbiory typu 'wszystkie światła'."""
+        groups: Dict[str, List[str]] = {}
+
         def all_matching(substr: str) -> List[str]:
+            # przez indeks trigramów, każda grupa liczona raz
             key = _slug(substr)
-            return [k for k in self.commands.keys() if key in k]
+            if key not in groups:
+                groups[key] = self._devices_containing(key)
+            return groups[key]
 
         base: Dict[str, List[str] | str] = {
             # Światła
@@ -252,9 +434,11 @@ class HardwareBridge:
         if "swiatlo 2" in self.commands:
             base.setdefault("drugie", "światło 2")
 
-        normalized: Dict[str, List[str] | str] = {}
+        # gotowe krotki: po _slug i tylko urządzenia, które istnieją w device_commands
+        normalized: Dict[str, Tuple[str, ...]] = {}
         for k, v in base.items():
-            normalized[_slug(k)] = v
+            v_list = [v] if isinstance(v, str) else v
+            normalized[_slug(k)] = tuple(s for s in map(_slug, v_list) if s in self.commands)
         return normalized
 
     # ---------------------------------------------------
@@ -266,39 +450,29 @@ class HardwareBridge:
         t = _normalize_spelling(_slug(text))
 
         # powtórz / to samo
-        if re.search(r"\b(powtorz|to samo|ponownie|jeszcze raz)\b", t):
+        if _RE_REPEAT.search(t):
             return self.last_action or None
 
         # toggle
-        if re.search(r"\b(odwrotnie|na odwrot|przelacz|toggle)\b", t):
+        if _RE_TOGGLE.search(t):
             if self.last_action == "włącz":
                 return "wyłącz"
             if self.last_action == "wyłącz":
                 return "włącz"
             return None
 
-        # słowa akcji (już po slug + normalize)
-        on_words = ["wlacz", "wlacz", "zaswiec", "uruchom", "odpal", "wlacz", "zalacz"]
-        off_words = ["wylacz", "zgas", "zatrzymaj"]
-
-        if any(w in t for w in on_words):
+        # słowa akcji (już po slug + normalize); "włącz" ma pierwszeństwo jak dotąd
+        if _RE_ON.search(t):
             return "włącz"
-        if any(w in t for w in off_words):
+        if _RE_OFF.search(t):
             return "wyłącz"
 
         return None
 
     def _strip_action_words(self, text: str) -> str:
         # pracujemy na znormalizowanym stringu
-        t = " " + _normalize_spelling(_slug(text)) + " "
-        t = re.sub(r"\b(wlacz|zaswiec|uruchom|odpal|zalacz)\b", " ", t)
-        t = re.sub(r"\b(wylacz|zgas|zatrzymaj)\b", " ", t)
-        t = re.sub(
-            r"\b(powtorz|to samo|ponownie|jeszcze raz|odwrotnie|na odwrot|przelacz|toggle)\b",
-            " ",
-            t,
-        )
-        return re.sub(r"\s+", " ", t).strip()
+        t = _RE_ALL_ACTIONS.sub(" ", _normalize_spelling(_slug(text)))
+        return " ".join(t.split())
 
     # ---------------------------------------------------
     # TARGETY (aliasy + fuzzy + „to samo”)
@@ -309,25 +483,21 @@ class HardwareBridge:
 
         # alias
         if key in self.aliases:
-            v = self.aliases[key]
-            if isinstance(v, list):
-                return [_slug(x) for x in v if _slug(x) in self.commands]
-            s = _slug(v)
-            return [s] if s in self.commands else []
+            return list(self.aliases[key])
 
         # dokładne
         if key in self.commands:
             return [key]
 
         # zawierające
-        contains = [dev for dev in self.commands if key in dev]
+        contains = self._devices_containing(key)
         if contains:
             return contains
 
         # fuzzy
-        match = difflib.get_close_matches(key, list(self.commands.keys()), n=1, cutoff=0.72)
+        match = self._fuzzy_device(key)
         if match:
-            return [match[0]]
+            return [match]
 
         # względne do last_targets
         if key in ("pierwsze", "pierwszy") and self.last_targets:
@@ -337,24 +507,61 @@ class HardwareBridge:
 
         return []
 
+    def _fuzzy_device(self, key: str) -> Optional[str]:
+        """
+        Najbliższa nazwa urządzenia (próg 72/100), zapamiętana per klucz.
+        rapidfuzz token_sort_ratio: odporne na kolejność słów ("dioda zielna"),
+        ale bez dopasowań częściowych — "radio" nie trafi w "zielona dioda".
+        """
+        if key not in self._fuzzy_cache:
+            if rf_process is not None:
+                hit = rf_process.extractOne(key, self._device_keys,
+                                            scorer=rf_fuzz.token_sort_ratio, score_cutoff=72)
+                self._fuzzy_cache[key] = hit[0] if hit else None
+            else:
+                match = difflib.get_close_matches(key, self._device_keys, n=1, cutoff=0.72)
+                self._fuzzy_cache[key] = match[0] if match else None
+        return self._fuzzy_cache[key]
+
+    def _prefetch_fuzzy(self, keys: List[str]) -> None:
+        """
+        Kilka nieznanych nazw w jednym zdaniu („swiatlo jeden i dioda zielna”):
+        jedno wywołanie rapidfuzz cdist dla wszystkich zamiast extractOne per część.
+        Wyniki lądują w _fuzzy_cache, więc _resolve_single tylko je odczytuje.
+        """
+        if rf_process is None or not self._device_keys:
+            return
+        todo = [
+            k for k in dict.fromkeys(keys)
+            if k not in self._fuzzy_cache and k not in self.aliases
+            and k not in self.commands and not self._devices_containing(k)
+        ]
+        if len(todo) < 2:
+            return
+        try:
+            scores = rf_process.cdist(todo, self._device_keys,
+                                      scorer=rf_fuzz.token_sort_ratio, score_cutoff=72)
+        except ImportError:
+            # cdist potrzebuje numpy — bez niego zostaje extractOne per klucz
+            return
+        for k, row in zip(todo, scores):
+            j = int(row.argmax())
+            self._fuzzy_cache[k] = self._device_keys[j] if row[j] else None
+
     def _resolve_targets(self, text: str) -> List[str]:
         parts = _split_targets(text)
+        if len(parts) > 1:
+            self._prefetch_fuzzy([_slug(p) for p in parts])
         targets: List[str] = []
         for p in parts:
             targets.extend(self._resolve_single(p))
 
         # „to samo / powtórz” → poprzednie targety
-        if not targets and re.search(r"\b(to samo|powtorz|ponownie|jeszcze raz)\b", _slug(text)):
+        if not targets and _RE_REPEAT.search(_slug(text)):
             return list(self.last_targets)
 
-        # unikaty
-        seen = set()
-        uniq: List[str] = []
-        for t in targets:
-            if t not in seen:
-                seen.add(t)
-                uniq.append(t)
-        return uniq
+        # unikaty (z zachowaniem kolejności)
+        return list(dict.fromkeys(targets))
 
     # ---------------------------------------------------
     # Stan z Shelly (LIVE)
@@ -376,7 +583,7 @@ class HardwareBridge:
 
         url = f"http://{ip}/rpc/Switch.GetStatus?id={chan_id}"
         try:
-            r = requests.get(url, timeout=1.5)
+            r = self._http_session().get(url, timeout=1.5)
             if r.status_code != 200:
                 return
             data = r.json()
@@ -387,11 +594,29 @@ class HardwareBridge:
         except Exception:
             return
 
+    def _http_session(self):
+        if self._http is None:
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+            self._http = session
+        return self._http
+
     def refresh_live_state(self) -> None:
-        """Odświeża stan wszystkich urządzeń, które mają mapowanie do Shelly."""
-        for dev in list(self.state.keys()):
-            if dev in SHELLY_LIGHT_MAP:
-                self._refresh_live_state_for_device(dev)
+        """Odświeża stan wszystkich urządzeń, które mają mapowanie do Shelly (równolegle)."""
+        if not requests:
+            return
+        now = time.monotonic()
+        if now - self._live_at < LIVE_STATE_TTL:
+            return
+        devs = [dev for dev in self.state if dev in SHELLY_LIGHT_MAP]
+        if len(devs) == 1:
+            self._refresh_live_state_for_device(devs[0])
+        elif devs:
+            # każdy wątek pisze inne klucze state/state_source
+            with ThreadPoolExecutor(max_workers=min(8, len(devs))) as ex:
+                list(ex.map(self._refresh_live_state_for_device, devs))
+        self._live_at = time.monotonic()
 
     # ---------------------------------------------------
     # Logika światła bez numeru
@@ -407,22 +632,27 @@ class HardwareBridge:
         # od razu slug + autokorekta
         raw = _normalize_spelling(_slug(raw_text))
 
-        # rozpoznaj akcję
-        action = self._parse_action(raw)
-        if not action:
-            return None
-
-        # musi być „swiatlo” po slugowaniu
+        # musi być „swiatlo” po slugowaniu — najtańszy test najpierw
         if "swiatlo" not in raw:
             return None
 
         # jeśli jest numer → nie ruszamy
-        if re.search(r"\b1\b|\b2\b", raw):
+        if _RE_NUM12.search(raw):
+            return None
+
+        # rozpoznaj akcję
+        action = self._parse_action(raw)
+        if not action:
             return None
 
-        # stan (z pamięci, ew. uzupełniony live)
-        on_list = [dev for dev, st in self.state.items() if st == "on"]
-        off_list = [dev for dev, st in self.state.items() if st == "off"]
+        # stan (z pamięci, ew. uzupełniony live) — jedno przejście
+        on_list: List[str] = []
+        off_list: List[str] = []
+        for dev, st in self.state.items():
+            if st == "on":
+                on_list.append(dev)
+            elif st == "off":
+                off_list.append(dev)
 
         # jedno ON przy wyłączaniu
         if action == "wyłącz" and len(on_list) == 1:
@@ -462,17 +692,25 @@ class HardwareBridge:
     # ---------------------------------------------------
 
     def _run(self, cmd: str) -> None:
+        kind, arg = _prepare_command(cmd)
         try:
-            subprocess.run(cmd, shell=True, check=False, timeout=10)
+            if kind == "http":
+                self._http_session().get(arg, timeout=10)
+            elif kind == "argv":
+                subprocess.run(arg, check=False, timeout=10)
+            else:
+                subprocess.run(arg, shell=True, check=False, timeout=10)
         except Exception as e:
-            print(f"❌ Błąd wykonania komendy: {e}")
+            logger.error("❌ Błąd wykonania komendy: %s", e)
 
     def _exec_for(self, action: str, targets: List[str]) -> Tuple[List[str], List[str]]:
         ok: List[str] = []
         missing: List[str] = []
+        cmds: List[str] = []
+        get = self.commands.get
 
         for dev in targets:
-            entry = self.commands.get(dev) or {}
+            entry = get(dev) or {}
             cmd = entry.get(action)
 
             if not cmd:
@@ -480,9 +718,17 @@ class HardwareBridge:
                 continue
 
             print(f"➡️ {action.upper()} → {dev}")
-            self._run(cmd)
+            cmds.append(cmd)
             ok.append(dev)
 
+        # urządzenia niezależne — komendy idą równolegle („wszystkie światła” = jeden czas, nie N)
+        if len(cmds) == 1:
+            self._run(cmds[0])
+        elif cmds:
+            with ThreadPoolExecutor(max_workers=min(8, len(cmds))) as ex:
+                list(ex.map(self._run, cmds))
+
+        for dev in ok:
             if action == "włącz":
                 self.state[dev] = "on"
             elif action == "wyłącz":
@@ -496,18 +742,23 @@ class HardwareBridge:
     # PUBLIC API
     # ---------------------------------------------------
 
+    def might_handle(self, text: str) -> bool:
+        """Tani filtr: False = execute(text) na pewno zwróci None (brak akcji i nie status)."""
+        return bool(self.commands) and might_handle(text)
+
     def execute(self, text: str) -> Optional[str]:
         """Główne wejście: parsuje tekst i odpala komendy sprzętowe."""
+        # zwykłe komendy shella (ls, git ...) odpadają bez I/O i zapytań do Shelly
+        if not self.might_handle(text):
+            return None
+
         # najpierw soft-refresh z kontekstu
         self._reload_state()
 
-        if not text or not self.commands:
-            return None
-
         slug = _slug(text)
 
         # debug: status świateł
-        if slug in ("swiatla status", "status swiatel", "swiatla stan", "status swiatla"):
+        if slug in _STATUS_SLUGS:
             lines: List[str] = []
             for dev in sorted(self.state.keys()):
                 if "swiatlo" in dev:
@@ -518,25 +769,23 @@ class HardwareBridge:
 
         raw = text
 
-        # jeszcze raz reload + live, żeby mieć świeży stan
-        self._reload_state()
-        self.refresh_live_state()
+        # stan LIVE tylko gdy komenda może dotyczyć świateł Shelly
+        # (_reload_state było już na wejściu — drugi odczyt pliku nic nie wnosił)
+        # po autokorekcie, jak w resolve_light_without_number („swialto” → „swiatlo”)
+        fixed = _normalize_spelling(slug)
+        if any(kw in fixed for kw in _SHELLY_HINTS):
+            self.refresh_live_state()
 
         # logika światło bez numeru (korzystająca ze stanu)
         modified = self.resolve_light_without_number(raw)
         if modified:
             raw = modified
 
-        # parsowanie akcji + targetów
+        # parsowanie akcji + targetów (bez akcji nie ma po co rozwiązywać targetów)
         action = self._parse_action(raw)
-        targets_text = self._strip_action_words(raw)
-        targets = self._resolve_targets(targets_text)
-
-        # brak akcji i brak targetów → brak intencji
-        if not action and not targets:
-            return None
         if not action:
             return None
+        targets = self._resolve_targets(self._strip_action_words(raw))
         if not targets:
             return None
 
@@ -11,11 +11,10 @@ def invoke(payload: dict):
         return {"ok": False, "error": f"not_a_directory: {path}"}
 
     try:
-        items = []
-        for name in sorted(os.listdir(path)):
-            full = os.path.join(path, name)
-            typ = "dir" if os.path.isdir(full) else "file"
-            items.append({"name": name, "type": typ})
+        # scandir: typ wpisu z d_type, bez osobnego stat() na każdy plik
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        items = [{"name": e.name, "type": "dir" if e.is_dir() else "file"} for e in entries]
         return {"ok": True, "path": path, "items": items}
     except Exception as e:
         return {"ok": False, "error": str(e)}
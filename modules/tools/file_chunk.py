@@ -1,6 +1,13 @@
+import codecs
 import os
 
 def invoke(payload: dict):
+    """
+    Fragment pliku w jednostkach BAJTÓW: `offset` i `size` to bajty UTF-8.
+    Granice są wyrównane do pełnych znaków — początek pomija bajty kontynuacji,
+    a niedokończona sekwencja na końcu zostaje na następny fragment.
+    Kolejny fragment zaczyna się od zwróconego `next_offset`.
+    """
     path = payload.get("path")
     offset = payload.get("offset", 0)
     size = payload.get("size", 20000)
@@ -11,14 +18,35 @@ def invoke(payload: dict):
     path = os.path.expanduser(path)
 
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            f.seek(offset)
-            chunk = f.read(size)
+        # pread: jeden syscall pod podany offset bajtowy, bez zwalniania/odtwarzania
+        # stanu dekodera — bezpieczne przy równoległych tool-callach
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            # +3 bajty zapasu: gdy size jest mniejszy niż znak, i tak oddajemy jeden cały znak
+            data = os.pread(fd, size + 3, offset)
+        finally:
+            os.close(fd)
+        end = min(size, len(data))
+        # offset w środku znaku → od następnego pełnego znaku
+        start = 0
+        while start < min(3, end) and (data[start] & 0xC0) == 0x80:
+            start += 1
+        dec = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        chunk = dec.decode(data[start:end])
+        while not chunk and dec.getstate()[0] and end < len(data):
+            chunk = dec.decode(data[end:end + 1])
+            end += 1
+        eof = end >= len(data) and len(data) < size + 3
+        if eof:
+            chunk += dec.decode(b"", final=True)
+        pending = len(dec.getstate()[0])
         return {
             "ok": True,
             "path": path,
-            "offset": offset,
+            "offset": offset + start,
             "size": size,
+            "next_offset": offset + end - pending,
+            "eof": eof,
             "content": chunk
         }
     except Exception as e:
@@ -1,6 +1,11 @@
+import io
 import os
 import re
 
+# wzorce, dla których trafienie w linii nie implikuje trafienia w całym pliku
+# (\A, \Z, negatywne lookaroundy widzą sąsiednie linie) — tylko skan per linia
+_NO_PRESCREEN_RE = re.compile(r"\\[AZ]|\(\?<?!")
+
 def invoke(payload: dict):
     root = payload.get("root")
     pattern = payload.get("pattern")
@@ -12,6 +17,8 @@ def invoke(payload: dict):
 
     results = []
     rx = re.compile(pattern, re.IGNORECASE)
+    # MULTILINE: ^ i $ na granicach linii, jak przy dopasowaniu pojedynczej linii
+    prescreen = None if _NO_PRESCREEN_RE.search(pattern) else re.compile(pattern, re.IGNORECASE | re.MULTILINE)
 
     for base, dirs, files in os.walk(root):
         for fn in files:
@@ -19,13 +26,18 @@ def invoke(payload: dict):
                 path = os.path.join(base, fn)
                 try:
                     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                        for lineno, line in enumerate(f, start=1):
-                            if rx.search(line):
-                                results.append({
-                                    "file": path,
-                                    "line": lineno,
-                                    "match": line.strip()
-                                })
+                        text = f.read()
+                    # jeden przebieg regexu po całym pliku; linie tylko gdy jest trafienie
+                    if prescreen and not prescreen.search(text):
+                        continue
+                    # linie z końcowym "\n" — tak jak przy iteracji po pliku
+                    for lineno, line in enumerate(io.StringIO(text), start=1):
+                        if rx.search(line):
+                            results.append({
+                                "file": path,
+                                "line": lineno,
+                                "match": line.strip()
+                            })
                 except:
                     pass
 
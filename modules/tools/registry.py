@@ -3,13 +3,19 @@ import importlib
 class ToolRegistry:
     def __init__(self):
         self.tools = {}
+        self.paths = {}
 
     def register(self, name: str, module_path: str):
-        mod = importlib.import_module(module_path)
-        self.tools[name] = mod
+        # import odroczony do pierwszego get() — narzędzia z ciężkimi
+        # zależnościami (bs4, playwright) nie spowalniają startu
+        self.paths[name] = module_path
+        self.tools.pop(name, None)
 
     def get(self, name: str):
-        return self.tools.get(name)
+        mod = self.tools.get(name)
+        if mod is None and name in self.paths:
+            mod = self.tools[name] = importlib.import_module(self.paths[name])
+        return mod
 
     def invoke(self, name: str, payload: dict):
         tool = self.get(name)
@@ -1,5 +1,10 @@
+import itertools
+import json
 import subprocess
+import threading
+import time
 import traceback
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from urllib.parse import quote_plus
 
 MAX_TEXT_LEN = 150_000
@@ -7,13 +12,111 @@ MAX_TEXT_LEN = 150_000
 # Python z venv, gdzie jest playwright + readability
 PLAYWRIGHT_PY = "/home/hal/HALbridge/.venv_playwright/bin/python"
 WEB_TOOL_PATH = "/home/hal/HALbridge/hal_webfetch.py"
+FETCH_TIMEOUT = 30           # > REQUEST_DEADLINE workera (25 s) — worker odpowiada pierwszy
+WEDGED_AFTER = 2             # tyle kolejnych timeoutów bez odpowiedzi → worker zawieszony, restart
+WORKER_RETRY_AFTER = 60      # worker padł zanim cokolwiek odpowiedział → tyle s tylko jednorazowe procesy
 
+# Długo żyjący worker `hal_webfetch.py --serve` (async Playwright, jeden Chromium).
+# Zapytania mają id, więc kilka wątków może czekać naraz; odpowiedzi rozdziela
+# wątek czytający stdout workera.
+_worker = None
+_worker_lock = threading.Lock()
+_pending = {}
+_ids = itertools.count(1)
+_timeouts = 0
+_worker_retry_at = 0.0
+
+
+class WorkerUnavailable(RuntimeError):
+    """Worker nie wstał (brak --serve w starym hal_webfetch, brak venv) — trzeba jednorazowego procesu."""
+
+
+def _reader(proc: subprocess.Popen) -> None:
+    global _timeouts
+    for line in proc.stdout:
+        try:
+            resp = json.loads(line)
+        except ValueError:
+            continue
+        proc.answered = True
+        _timeouts = 0
+        fut = _pending.pop(resp.get("id"), None)
+        if fut is not None:
+            fut.set_result(resp)
+    # EOF — worker padł; czekający dostają błąd, następne wywołanie postawi nowy
+    with _worker_lock:
+        err = "worker_failed" if getattr(proc, "answered", False) else "worker_unavailable"
+        for rid in [rid for rid, f in _pending.items() if getattr(f, "proc", None) is proc]:
+            _pending.pop(rid).set_result({"ok": False, "error": err})
+
+
+def _get_worker() -> subprocess.Popen:
+    global _worker
+    if _worker is None or _worker.poll() is not None:
+        if time.monotonic() < _worker_retry_at:
+            raise WorkerUnavailable("worker niedawno nie wstał")
+        _worker = subprocess.Popen(
+            [PLAYWRIGHT_PY, WEB_TOOL_PATH, "--serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        threading.Thread(target=_reader, args=(_worker,), daemon=True, name="webfetch-reader").start()
+    return _worker
+
+
+def _kill_worker() -> None:
+    global _worker
+    if _worker is not None:
+        try:
+            _worker.kill()
+            _worker.wait(timeout=5)
+        except Exception:
+            pass
+        _worker = None
 
-def invoke(payload: dict) -> dict:
-    url = payload.get("url")
-    if not url:
-        return {"ok": False, "error": "missing_url"}
 
+def _worker_died_on_start() -> WorkerUnavailable:
+    global _worker_retry_at
+    _worker_retry_at = time.monotonic() + WORKER_RETRY_AFTER
+    return WorkerUnavailable("worker zakończył się bez odpowiedzi")
+
+
+def _fetch_via_worker(url: str) -> dict:
+    global _timeouts
+    rid = next(_ids)
+    fut: Future = Future()
+    with _worker_lock:
+        w = _get_worker()
+        fut.proc = w
+        _pending[rid] = fut
+        try:
+            w.stdin.write(json.dumps({"id": rid, "url": url}).encode("utf-8") + b"\n")
+            w.stdin.flush()
+        except OSError:
+            _pending.pop(rid, None)
+            answered = getattr(w, "answered", False)
+            _kill_worker()
+            if not answered:
+                raise _worker_died_on_start()
+            return {"ok": False, "error": "worker_failed"}
+    try:
+        res = fut.result(timeout=FETCH_TIMEOUT)
+    except FutureTimeout:
+        # worker ma własny REQUEST_DEADLINE < FETCH_TIMEOUT — brak odpowiedzi znaczy, że utknął
+        _pending.pop(rid, None)
+        with _worker_lock:
+            _timeouts += 1
+            if _timeouts >= WEDGED_AFTER and _worker is w:
+                _timeouts = 0
+                _kill_worker()
+        return {"ok": False, "error": "worker_timeout"}
+    if res.get("error") == "worker_unavailable":
+        raise _worker_died_on_start()
+    return res
+
+
+def _fetch_oneshot(url: str) -> dict:
     cmd = [PLAYWRIGHT_PY, WEB_TOOL_PATH, url]
 
     try:
@@ -43,6 +146,23 @@ def invoke(payload: dict) -> dict:
         }
 
 
+def invoke(payload: dict) -> dict:
+    url = payload.get("url")
+    if not url:
+        return {"ok": False, "error": "missing_url"}
+
+    try:
+        res = _fetch_via_worker(url)
+    except Exception:
+        # worker nie wstał (brak venv, stary hal_webfetch bez --serve) → jednorazowy proces jak dawniej
+        with _worker_lock:
+            _kill_worker()
+        return _fetch_oneshot(url)
+    if not res.get("ok"):
+        return {"ok": False, "error": res.get("error", "fetch_failed"), "details": res.get("details", "")}
+    return {"ok": True, "url": url, "text": res.get("text", "")[:MAX_TEXT_LEN]}
+
+
 def resolve_natural_query(text: str) -> str | None:
     if not text:
         return None
@@ -0,0 +1,30 @@
+from modules.tools import file_chunk
+
+
+def _read_all(path, size):
+    parts, offset = [], 0
+    while True:
+        res = file_chunk.invoke({"path": str(path), "offset": offset, "size": size})
+        assert res["ok"]
+        parts.append(res["content"])
+        if res["eof"]:
+            return "".join(parts)
+        offset = res["next_offset"]
+
+
+def test_paging_never_splits_utf8(tmp_path):
+    text = "zażółć gęślą jaźń 🙂 " * 50
+    path = tmp_path / "pl.txt"
+    path.write_text(text, encoding="utf-8")
+
+    for size in (1, 2, 3, 5, 7, 64):
+        assert _read_all(path, size) == text
+
+
+def test_offset_inside_character_skips_to_next(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("ąb", encoding="utf-8")
+
+    res = file_chunk.invoke({"path": str(path), "offset": 1, "size": 10})
+    assert res["content"] == "b"
+    assert res["offset"] == 2
@@ -0,0 +1,28 @@
+from modules.tools import file_search
+
+
+def _search(root, pattern):
+    res = file_search.invoke({"root": str(root), "pattern": pattern})
+    assert res["ok"]
+    return [(r["line"], r["match"]) for r in res["results"]]
+
+
+def test_anchored_patterns_match_per_line(tmp_path):
+    (tmp_path / "a.py").write_text("import os\ndef foo():\n    return 1\n", encoding="utf-8")
+
+    assert _search(tmp_path, r"^def ") == [(2, "def foo():")]
+    assert _search(tmp_path, r"foo\(\):$") == [(2, "def foo():")]
+    assert _search(tmp_path, r"\Areturn") == []
+    assert _search(tmp_path, r"\A    return") == [(3, "return 1")]
+
+
+def test_negative_lookbehind_at_line_start(tmp_path):
+    (tmp_path / "b.txt").write_text("x\nfoo\n", encoding="utf-8")
+
+    assert _search(tmp_path, r"(?<!\s)foo") == [(2, "foo")]
+
+
+def test_no_match_skips_file(tmp_path):
+    (tmp_path / "c.md").write_text("nothing here\n", encoding="utf-8")
+
+    assert _search(tmp_path, r"^def ") == []
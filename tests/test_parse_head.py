@@ -0,0 +1,16 @@
+import gpt_chat_v3 as chat
+
+
+def test_url_fragment_is_kept():
+    assert chat._parse_head("https://example.com/page#sec --headers", 1) == (
+        ["https://example.com/page#sec"],
+        "--headers",
+    )
+
+
+def test_quoted_argument_and_raw_rest():
+    assert chat._parse_head('"my mod#1" --flag "a b"', 1) == (["my mod#1"], '--flag "a b"')
+
+
+def test_rest_empty_when_fewer_tokens():
+    assert chat._parse_head("only", 2) == (["only"], "")
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import gpt_chat_v3 as chat
+
+
+class _Embeddings:
+    """Każdy prompt ma ten sam wektor — parafrazy zawsze „trafiają”."""
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, model, input):
+        self.calls += 1
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0, 0.0])], usage=None)
+
+
+def _api(tmp_path, answers):
+    cfg = chat.Config()
+    cfg.ENABLE_RESP_CACHE = False
+    cfg.ENABLE_SEM_CACHE = True
+    cfg.SEM_CACHE_PATH = str(tmp_path / "semcache.npz")
+    log = SimpleNamespace(log=lambda *a, **k: None)
+
+    api = object.__new__(chat.GPTChatAPI)
+    api.cfg = cfg
+    api.logger = log
+    api._client = SimpleNamespace(embeddings=_Embeddings())
+    api.sem_cache = chat.SemanticCache(cfg, log)
+    api.meter = SimpleNamespace(add_usage=lambda **k: None)
+    api.memory = SimpleNamespace(add_message=lambda *a: None)
+    api.session_id = "t"
+    api._maybe_autosummarize = lambda *a, **k: None
+    api._tools_schema = []
+    api.history = []
+    api._messages_for = lambda prompt: (
+        [{"role": "system", "content": "static"}] + api.history + [{"role": "user", "content": prompt}]
+    )
+    api.llm_calls = []
+
+    def stream_chat(**kw):
+        api.llm_calls.append(kw["messages"][-1]["content"])
+        return answers.pop(0), ([], [], []), None
+
+    api._stream_chat = stream_chat
+    api.ran = []
+    api.validator = SimpleNamespace(validate=lambda cmd: (True, None))
+    api.exec = SimpleNamespace(run=lambda cmd: (api.ran.append(cmd), (0, f"ran {cmd}"))[1])
+    return api
+
+
+def test_paraphrase_hit_is_never_executed(tmp_path):
+    api = _api(tmp_path, ["wykonaj: rm b.txt"])
+    # wpis z komendą dla a.txt (np. z pliku cache sprzed poprawki)
+    api.sem_cache.add(np.array([1.0, 0.0, 0.0], dtype=np.float32), "usuń plik a.txt",
+                      "wykonaj: rm a.txt", chat.SemanticCache.context_key(api._messages_for("x")))
+
+    assert api.ask_ai("usuń plik b.txt") == "ran rm b.txt"
+    assert api.ran == ["rm b.txt"]
+    assert api.client.embeddings.calls == 0
+
+
+def test_command_answers_are_not_cached(tmp_path):
+    api = _api(tmp_path, ["```bash\nrm a.txt\n```", "ok"])
+
+    api.ask_ai("usuń plik a.txt", execute=False)
+    assert api.sem_cache.answers == []
+
+
+def test_different_history_misses(tmp_path):
+    api = _api(tmp_path, ["pierwsza", "druga"])
+    api.history = [{"role": "user", "content": "wymień dwa miasta"},
+                   {"role": "assistant", "content": "Kraków, Gdańsk"}]
+    assert api.ask_ai("a drugi?", execute=False) == "pierwsza"
+
+    api.history = [{"role": "user", "content": "wymień dwie rzeki"},
+                   {"role": "assistant", "content": "Wisła, Odra"}]
+    assert api.ask_ai("a drugi?", execute=False) == "druga"
+    assert api.llm_calls == ["a drugi?", "a drugi?"]
+
+    api.history = [{"role": "user", "content": "wymień dwa miasta"},
+                   {"role": "assistant", "content": "Kraków, Gdańsk"}]
+    assert api.ask_ai("a drugi?", execute=False) == "pierwsza"
+    assert len(api.llm_calls) == 2
@@ -0,0 +1,13 @@
+"""
+Punkt wejścia WSGI dla HalBridge (zamiast serwera deweloperskiego Werkzeug):
+
+    gunicorn -k gthread -w 1 --threads 8 --keep-alive 30 \
+        --certfile /opt/halbridge/certs/cert.pem --keyfile /opt/halbridge/certs/key.pem \
+        -b 0.0.0.0:5000 wsgi:app
+
+Jeden proces, współbieżność z wątków. Każdy worker gunicorna ma własne instancje
+agenta, powłoki, workera Playwright i HardwareBridge — przy -w >1 mostki trzymają
+osobny stan urządzeń, a hw_context.json zapisują z opóźnieniem (SAVE_DEBOUNCE),
+więc przez ułamek sekundy mogą działać na nieaktualnym stanie drugiego procesu.
+"""
+from halbridge_server import app  # noqa: F401